@@ -1,12 +1,14 @@
 #audio-backend/app/main.py
 
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.exceptions import RequestValidationError
+from functools import lru_cache
 from audio_backend.app.api import audio, realtime_audio
 
+@lru_cache(maxsize=1)
 def get_app():
-    app = FastAPI(title="Audio Processing API")
+    app = FastAPI(title="Audio Processing API", default_response_class=ORJSONResponse)
 
     #
     app.include_router(audio.router, prefix="/audio", tags=["Audio"])
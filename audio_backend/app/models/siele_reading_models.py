@@ -2,7 +2,7 @@
 from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Index, CheckConstraint
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC
 
 from audio_backend.app.core.database import Base
 
@@ -80,8 +80,11 @@ class SieleReadingPassage(Base):
     # 词汇标注
     annotations = Column(JSONB, nullable=False, server_default='[]', doc='词汇标注（关联 words 表）')
     
-    # 语义向量
-    embedding = Column(Vector(768), nullable=True)
+    # 语义向量（FP16 halfvec，需 pgvector >= 0.7；行体积/索引/IO 减半，相似度召回几乎无损）
+    # 写入时 HALFVEC 的 bind 处理会把 float 列表转换为 float16
+    # 已有库的迁移（改列类型 + 按 halfvec 操作符类重建索引）:
+    #   audio_backend/migrations/20261015_siele_passage_embedding_halfvec.sql
+    embedding = Column(HALFVEC(768), nullable=True)
     
     # 元数据
     difficulty_level = Column(Float, nullable=True)
@@ -99,5 +102,9 @@ class SieleReadingPassage(Base):
     __table_args__ = (
         CheckConstraint('tarea_number BETWEEN 1 AND 5', name='check_tarea_number'),
         Index('idx_passage_tarea', 'tarea_number'),
-        Index('idx_passage_embedding', embedding, postgresql_using='ivfflat'),
+        Index(
+            'idx_passage_embedding', embedding,
+            postgresql_using='ivfflat',
+            postgresql_ops={'embedding': 'halfvec_l2_ops'}
+        ),
     )
\ No newline at end of file
@@ -27,9 +27,13 @@ class Story(Base):
         'Chapter',
         back_populates='story',
         cascade='all, delete-orphan',
+        passive_deletes=True,  # 删除故事时交给数据库 ON DELETE CASCADE，不再逐个加载章节
         order_by='Chapter.chapter_number'
     )
 
+    # 插入/更新时用 RETURNING 直接取回 created_at / updated_at，免去 refresh
+    __mapper_args__ = {'eager_defaults': True}
+
 
 class Chapter(Base):
     __tablename__ = 'chapters'
@@ -51,6 +55,7 @@ class Chapter(Base):
         'Paragraph',
         back_populates='chapter',
         cascade='all, delete-orphan',
+        passive_deletes=True,
         order_by='Paragraph.paragraph_number'
     )
 
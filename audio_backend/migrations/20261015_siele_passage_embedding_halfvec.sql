@@ -0,0 +1,31 @@
+-- siele_reading_passages.embedding: vector(768) -> halfvec(768)（需 pgvector >= 0.7）
+-- 旧的 ivfflat 索引建在 vector 操作符类上，改列类型前先删掉，改完按 halfvec_l2_ops 重建
+-- 与 audio_backend/app/models/siele_reading_models.py 中的 idx_passage_embedding 保持一致
+
+-- ========== up ==========
+BEGIN;
+
+DROP INDEX IF EXISTS idx_passage_embedding;
+
+ALTER TABLE siele_reading_passages
+    ALTER COLUMN embedding TYPE halfvec(768) USING embedding::halfvec(768);
+
+CREATE INDEX idx_passage_embedding
+    ON siele_reading_passages
+    USING ivfflat (embedding halfvec_l2_ops);
+
+COMMIT;
+
+-- ========== down ==========
+-- BEGIN;
+--
+-- DROP INDEX IF EXISTS idx_passage_embedding;
+--
+-- ALTER TABLE siele_reading_passages
+--     ALTER COLUMN embedding TYPE vector(768) USING embedding::vector(768);
+--
+-- CREATE INDEX idx_passage_embedding
+--     ON siele_reading_passages
+--     USING ivfflat (embedding vector_l2_ops);
+--
+-- COMMIT;
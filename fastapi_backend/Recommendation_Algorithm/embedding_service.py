@@ -2,8 +2,11 @@
 """
 简单同步版 embedding 服务
 """
+import hashlib
+import threading
+from collections import OrderedDict
 from functools import lru_cache
-from typing import List
+from typing import List, Optional
 
 import numpy as np
 from sentence_transformers import SentenceTransformer
@@ -16,18 +19,81 @@ MODEL_NAME = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
 # 参考：https://huggingface.co/sentence-transformers/paraphrase-multilingual-mpnet-base-v2
 # 该模型在中文、英文、德文等多种语言上表现良好
 
+# 按文本内容哈希缓存向量：相同文本（如未修改的文章重新保存）不再重复推理
+EMBEDDING_CACHE_SIZE = 2048
+_emb_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+_emb_cache_lock = threading.Lock()
+
 @lru_cache(maxsize=1)
 def _load_model() -> SentenceTransformer:
     # 进程内只加载一次，gunicorn/uvicorn worker 会各自持有一份
     return SentenceTransformer(MODEL_NAME)
 
+def _normalize(text: str) -> str:
+    return text.strip()
+
+def text_hash(text: str) -> str:
+    """规范化文本的 sha256，作为 embedding 缓存键"""
+    return hashlib.sha256(_normalize(text).encode("utf-8")).hexdigest()
+
+def _cache_get(key: str) -> Optional[List[float]]:
+    with _emb_cache_lock:
+        vec = _emb_cache.get(key)
+        if vec is not None:
+            _emb_cache.move_to_end(key)
+        return vec
+
+def _cache_put(key: str, vec: List[float]) -> None:
+    with _emb_cache_lock:
+        _emb_cache[key] = vec
+        _emb_cache.move_to_end(key)
+        while len(_emb_cache) > EMBEDDING_CACHE_SIZE:
+            _emb_cache.popitem(last=False)
+
 def get_embedding(text: str) -> List[float]:
     """
     将任意文本转 768 维向量，直接用于 pgvector (float4[])
     """
     if not text:
         return None
+    key = text_hash(text)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
     model = _load_model()
-    emb: np.ndarray = model.encode(text, normalize_embeddings=True)
+    emb: np.ndarray = model.encode(_normalize(text), normalize_embeddings=True)
     # 转成 Python list，SQLAlchemy 自动映射到 pg vector
-    return emb.tolist()
+    vec = emb.tolist()
+    _cache_put(key, vec)
+    return vec
+
+def get_embeddings(texts: List[str]) -> List[Optional[List[float]]]:
+    """
+    批量版 get_embedding：未命中缓存的文本合并为一次 encode 调用
+    返回与 texts 顺序一致的向量列表（空文本对应 None）
+    """
+    results: List[Optional[List[float]]] = [None] * len(texts)
+    pending = {}  # 缓存键 -> 需要该向量的下标
+    for i, text in enumerate(texts):
+        if not text:
+            continue
+        key = text_hash(text)
+        cached = _cache_get(key)
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.setdefault(key, []).append(i)
+
+    if pending:
+        keys = list(pending)
+        model = _load_model()
+        embs: np.ndarray = model.encode(
+            [_normalize(texts[pending[k][0]]) for k in keys],
+            normalize_embeddings=True,
+        )
+        for key, emb in zip(keys, embs):
+            vec = emb.tolist()
+            _cache_put(key, vec)
+            for i in pending[key]:
+                results[i] = vec
+    return results
@@ -1,6 +1,8 @@
 # fastapi_backend/main.py
 import os
+from functools import lru_cache
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from pathlib import Path
 from dotenv import load_dotenv
 from starlette.middleware.sessions import SessionMiddleware
@@ -9,26 +11,30 @@ from fastapi.staticfiles import StaticFiles
 # 缓存需要的
 import redis.asyncio as redis
 from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
 from fastapi_cache.backends.redis import RedisBackend
 
 # MongoDB
 from audio_backend.app.core.mongodb import init_mongodb, close_mongodb
+from services.parse_worker import shutdown_parse_pool
 
 # 路由
 from fastapi_backend.routes.auth_routes import router as auth_router
 from fastapi_backend.routes.siele_routes import router as siele_router
 from fastapi_backend.routes.siele_admin_routes import router as siele_admin_router
-from fastapi_backend.routes.story_routes import router as story_router
+from fastapi_backend.routes.story_routes import router as story_router, close_embed_redis, shutdown_embed_executor
 from fastapi_backend.routes.tourism_admin_routes import router as tourism_admin_routes 
 from fastapi_backend.routes.place_routes import router as place_router
 
 
+@lru_cache(maxsize=1)
 def get_app():
     load_dotenv()
 
     DATABASE_URL = os.getenv("DATABASE_URL")
     SECRET_KEY = os.getenv("SECRET_KEY")
     REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
     
     # MongoDB 配置
     MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
@@ -37,7 +43,8 @@ def get_app():
     if not DATABASE_URL or not SECRET_KEY:
         raise ValueError("Missing essential environment variables. Check your .env file.")
 
-    app = FastAPI(title="LingualAudio API")
+    # orjson 原生序列化 datetime，列表接口比标准库 json 快得多
+    app = FastAPI(title="LingualAudio API", default_response_class=ORJSONResponse)
 
     # --- 中间件 ---
     app.add_middleware(
@@ -64,8 +71,10 @@ def get_app():
     else:
         uploads_dir = (BASE_DIR / "uploads").resolve()
     uploads_dir.mkdir(parents=True, exist_ok=True)
-    print("📁 STATIC /files =>", uploads_dir)
-    app.mount("/files", StaticFiles(directory=str(uploads_dir)), name="uploaded_files")
+    # 生产环境交给 Nginx sendfile（SERVE_FILES=0），开发环境才走 StaticFiles
+    if os.getenv("SERVE_FILES", "1").lower() in ("1", "true", "yes"):
+        print("📁 STATIC /files =>", uploads_dir)
+        app.mount("/files", StaticFiles(directory=str(uploads_dir)), name="uploaded_files")
 
     # --- 健康检查 ---
     @app.get("/")
@@ -84,10 +93,20 @@ def get_app():
     async def startup_event():
         # 初始化 Redis 缓存
         try:
-            r = redis.from_url(REDIS_URL, encoding="utf8", decode_responses=True)
-            FastAPICache.init(RedisBackend(r), prefix="fastapi-cache")
+            # 多个 worker 共用同一份 Redis 缓存；from_url 是惰性的，先 ping 确认可用
+            pool = redis.ConnectionPool.from_url(
+                REDIS_URL,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                encoding="utf8",
+                decode_responses=True,
+            )
+            app.state.redis_pool = pool
+            r = redis.Redis(connection_pool=pool)
+            await r.ping()
+            FastAPICache.init(RedisBackend(r), prefix="lapi")
             print("✅ Redis cache initialized:", REDIS_URL)
         except Exception as e:
+            FastAPICache.init(InMemoryBackend(), prefix="lapi")
             print(f"⚠️  Redis init failed: {e}, using in-memory cache")
         
         # 初始化 MongoDB
@@ -102,5 +121,11 @@ def get_app():
     async def shutdown_event():
         close_mongodb()
         print("👋 MongoDB connection closed")
+        pool = getattr(app.state, "redis_pool", None)
+        if pool is not None:
+            await pool.disconnect()
+        shutdown_parse_pool()
+        shutdown_embed_executor()
+        await close_embed_redis()
 
     return app
\ No newline at end of file
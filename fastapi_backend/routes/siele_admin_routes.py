@@ -2,12 +2,13 @@
 """
 SIELE 阅读材料管理路由 - 支持词汇标注
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import insert, update
 from sqlalchemy.orm import Session
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 import asyncio
 import logging
 import sys
@@ -20,18 +21,22 @@ if str(project_root) not in sys.path:
 try:
     from audio_backend.app.core.database import get_db
     from audio_backend.app.core.mongodb import get_mongo_db
-    from services.markup_parser import SieleMarkupParser
+    from services.markup_parser import SieleMarkupParser, lemmas_to_dicts
     from services.nlp_service import get_nlp_service
+    from services.parse_worker import parse_and_analyze
     from audio_backend.app.models.siele_reading_models import SieleReadingPassage
-    from fastapi_backend.Recommendation_Algorithm.embedding_service import get_embedding
+    from fastapi_backend.Recommendation_Algorithm.embedding_service import get_embedding, get_embeddings
 except ImportError as e:
     print(f"⚠️  Warning: Failed to import reading modules: {e}")
     def get_db(): raise NotImplementedError("database module not available")
     def get_mongo_db(): raise NotImplementedError("mongodb module not available")
     class SieleMarkupParser: pass
+    def lemmas_to_dicts(lemmas): raise NotImplementedError("markup_parser not available")
     def get_nlp_service(): raise NotImplementedError("nlp_service not available")
+    async def parse_and_analyze(markup_text, with_html=False, with_nlp=True): raise NotImplementedError("parse_worker not available")
     class SieleReadingPassage: pass
     def get_embedding(text): raise NotImplementedError("embedding_service not available")
+    def get_embeddings(texts): raise NotImplementedError("embedding_service not available")
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +48,11 @@ class MarkupTextInput(BaseModel):
     markup_text: str
 
 
+class BulkMarkupInput(BaseModel):
+    """批量标记文本输入"""
+    markup_texts: List[str]
+
+
 class PassageResponse(BaseModel):
     """文章创建响应"""
     passage_id: int
@@ -56,37 +66,93 @@ class PassageResponse(BaseModel):
     annotation_count: int  # ⭐ 新增：标注单词数
 
 
+def _normalize_markup(text: str) -> str:
+    """去掉 BOM、统一换行为 LF、去除行尾空白，减小入库行体积"""
+    text = text.lstrip("\ufeff").replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.split("\n")).strip()
+
+
+def _passage_fields(parsed_data: dict, nlp_result: dict, embedding) -> dict:
+    """由解析结果 + NLP 结果生成 PostgreSQL 记录的字段"""
+    return dict(
+        tarea_number=parsed_data["tarea_number"],
+        title=parsed_data["title"],
+        raw_markup_text=parsed_data["raw_markup_text"],  # ⭐ 保存原始标记文本
+        plain_text_es=parsed_data["plain_text_es"],
+        lemmas=parsed_data["lemmas"],
+        pos_distribution=parsed_data["pos_distribution"],
+        paragraphs=parsed_data["paragraphs"],
+        annotations=parsed_data["annotations"],  # ⭐ 保存词汇标注
+        embedding=embedding,
+        difficulty_level=nlp_result["difficulty_level"],
+        word_count=nlp_result["word_count"],
+        sentence_count=nlp_result["sentence_count"]
+    )
+
+
+def _new_passage(parsed_data: dict, nlp_result: dict, embedding) -> SieleReadingPassage:
+    return SieleReadingPassage(**_passage_fields(parsed_data, nlp_result, embedding))
+
+
+def _questions_doc(passage_id: int, parsed_data: dict) -> dict:
+    return {
+        "passage_id": passage_id,
+        "tarea_number": parsed_data["tarea_number"],
+        "tarea_type": parsed_data["question_type"],  # ⭐ 使用解析出的题型
+        "questions": parsed_data["questions"],
+        "created_at": datetime.utcnow()
+    }
+
+
+async def _save_questions(db_mongo, passage, parsed_data: dict) -> Optional[str]:
+    """有题目时写入 MongoDB，并回填 passage.mongo_questions_id"""
+    if not parsed_data["questions"]:
+        return None
+    questions_collection = db_mongo["siele_reading_questions"]
+    result = await questions_collection.insert_one(_questions_doc(passage.id, parsed_data))
+    mongo_id = str(result.inserted_id)
+    
+    # ⭐ 更新 PostgreSQL 的 mongo_questions_id
+    passage.mongo_questions_id = mongo_id
+    return mongo_id
+
+
+def _passage_response(passage_id: int, mongo_id, parsed_data: dict, nlp_result: dict) -> PassageResponse:
+    return PassageResponse(
+        passage_id=passage_id,
+        mongo_questions_id=mongo_id,
+        message="创建成功！",
+        tarea_number=parsed_data["tarea_number"],
+        title=parsed_data["title"],
+        paragraph_count=len(parsed_data["paragraphs"]),
+        question_count=len(parsed_data["questions"]),
+        word_count=nlp_result["word_count"],
+        annotation_count=len(parsed_data["annotations"])  # ⭐ 返回标注数量
+    )
+
+
 @router.post("/preview")
 async def preview_markup(
     data: MarkupTextInput,
-    db: Session = Depends(get_db)
+    lite: bool = Query(False, description="只解析段落和题目，跳过词汇标注和 NLP 分析")
 ):
     """
     预览标记文本的解析结果（不保存到数据库）
-    ⭐ 现在包含词汇标注
+    ⭐ 现在包含词汇标注（lite=true 时不含，只用于快速检查排版/题目）
     """
     try:
-        # ⭐ 传入数据库 session
-        parser = SieleMarkupParser(db_session=db)
-        result = parser.parse(data.markup_text)
+        # ⭐ 解析 + NLP 分析 + 带标注的 HTML（供前端预览），都在进程池中完成
+        result, nlp_result = await parse_and_analyze(
+            _normalize_markup(data.markup_text),
+            with_html=not lite,
+            with_nlp=not lite
+        )
         
         # 添加 NLP 分析
-        nlp_service = get_nlp_service()
-        if result["plain_text_es"]:
-            nlp_result = nlp_service.analyze_text(result["plain_text_es"])
+        if nlp_result is not None and result["plain_text_es"]:
             result["word_count"] = nlp_result["word_count"]
             result["sentence_count"] = nlp_result["sentence_count"]
-            result["difficulty_estimate"] = nlp_service.estimate_difficulty(
-                nlp_result["pos_distribution"],
-                nlp_result["word_count"]
-            )
-        
-        # ⭐ 生成带标注的 HTML（可选，供前端预览）
-        if result["annotations"]:
-            result["paragraphs"] = parser.generate_paragraph_html(
-                result["paragraphs"],
-                result["annotations"]
-            )
+            result["difficulty_estimate"] = nlp_result["difficulty_level"]
         
         return {
             "success": True,
@@ -117,17 +183,12 @@ async def create_passage_from_markup(
     6. 保存题目到 MongoDB
     """
     try:
-        # 1. ⭐ 解析标记 + 生成词汇标注
-        parser = SieleMarkupParser(db_session=db_pg)
-        parsed_data = parser.parse(data.markup_text)
+        # 1-2. ⭐ 解析标记 + 生成词汇标注 + NLP 分析（进程池）
+        parsed_data, nlp_result = await parse_and_analyze(_normalize_markup(data.markup_text))
         
         if not parsed_data["plain_text_es"]:
             raise HTTPException(400, "未找到西班牙语文本")
         
-        # 2. NLP 分析
-        nlp_service = get_nlp_service()
-        nlp_result = nlp_service.analyze_text(parsed_data["plain_text_es"])
-        
         # 3. 生成语义向量
         embedding = await asyncio.to_thread(
             get_embedding,
@@ -135,64 +196,25 @@ async def create_passage_from_markup(
         )
         
         # 4. ⭐ 创建 PostgreSQL 记录（包含所有字段）
-        passage = SieleReadingPassage(
-            tarea_number=parsed_data["tarea_number"],
-            title=parsed_data["title"],
-            raw_markup_text=parsed_data["raw_markup_text"],  # ⭐ 保存原始标记文本
-            plain_text_es=parsed_data["plain_text_es"],
-            lemmas=parsed_data["lemmas"],
-            pos_distribution=parsed_data["pos_distribution"],
-            paragraphs=parsed_data["paragraphs"],
-            annotations=parsed_data["annotations"],  # ⭐ 保存词汇标注
-            embedding=embedding,
-            difficulty_level=nlp_service.estimate_difficulty(
-                nlp_result["pos_distribution"],
-                nlp_result["word_count"]
-            ),
-            word_count=nlp_result["word_count"],
-            sentence_count=nlp_result["sentence_count"]
-        )
+        passage = _new_passage(parsed_data, nlp_result, embedding)
         
         db_pg.add(passage)
         db_pg.flush()
+        # commit 后实例会过期，先取出 flush 得到的主键，避免再发一次 SELECT
+        passage_id = passage.id
         
         # 5. 如果有题目，保存到 MongoDB
-        mongo_id = None
-        if parsed_data["questions"]:
-            questions_collection = db_mongo["siele_reading_questions"]
-            mongo_doc = {
-                "passage_id": passage.id,
-                "tarea_number": parsed_data["tarea_number"],
-                "tarea_type": parsed_data["question_type"],  # ⭐ 使用解析出的题型
-                "questions": parsed_data["questions"],
-                "created_at": datetime.utcnow()
-            }
-            result = await questions_collection.insert_one(mongo_doc)
-            mongo_id = str(result.inserted_id)
-            
-            # ⭐ 更新 PostgreSQL 的 mongo_questions_id
-            passage.mongo_questions_id = mongo_id
+        mongo_id = await _save_questions(db_mongo, passage, parsed_data)
         
         db_pg.commit()
-        db_pg.refresh(passage)
         
         logger.info(
-            f"✅ Created passage {passage.id} with "
+            f"✅ Created passage {passage_id} with "
             f"{len(parsed_data['questions'])} questions, "
             f"{len(parsed_data['annotations'])} annotations"
         )
         
-        return PassageResponse(
-            passage_id=passage.id,
-            mongo_questions_id=mongo_id,
-            message="创建成功！",
-            tarea_number=parsed_data["tarea_number"],
-            title=parsed_data["title"],
-            paragraph_count=len(parsed_data["paragraphs"]),
-            question_count=len(parsed_data["questions"]),
-            word_count=nlp_result["word_count"],
-            annotation_count=len(parsed_data["annotations"])  # ⭐ 返回标注数量
-        )
+        return _passage_response(passage_id, mongo_id, parsed_data, nlp_result)
         
     except HTTPException:
         raise
@@ -202,6 +224,81 @@ async def create_passage_from_markup(
         raise HTTPException(500, f"创建失败: {str(e)}")
 
 
+@router.post("/passages/bulk", response_model=List[PassageResponse])
+async def create_passages_bulk(
+    data: BulkMarkupInput,
+    db_pg: Session = Depends(get_db),
+    db_mongo: AsyncIOMotorDatabase = Depends(get_mongo_db)
+):
+    """
+    批量创建阅读材料（批量导入用）
+    NLP 分析走 nlp.pipe、语义向量一次批量 encode，避免逐篇调用
+    """
+    if not data.markup_texts:
+        return []
+    
+    try:
+        parser = SieleMarkupParser(db_session=db_pg)
+        # 正则 + spaCy 都是 CPU 密集，放到线程里跑，别卡住事件循环
+        parsed_list = await asyncio.to_thread(
+            parser.parse_many, [_normalize_markup(t) for t in data.markup_texts]
+        )
+        for parsed_data in parsed_list:
+            parsed_data["lemmas"] = lemmas_to_dicts(parsed_data["lemmas"])
+            parsed_data["annotations"] = parsed_data["annotations"].to_dicts()
+        
+        for i, parsed_data in enumerate(parsed_list):
+            if not parsed_data["plain_text_es"]:
+                raise HTTPException(400, f"第 {i + 1} 篇未找到西班牙语文本")
+        
+        plain_texts = [p["plain_text_es"] for p in parsed_list]
+        nlp_results = await asyncio.to_thread(get_nlp_service().analyze_summary_many, plain_texts)
+        embeddings = await asyncio.to_thread(get_embeddings, plain_texts)
+        
+        # 多行 INSERT ... RETURNING id：一次往返拿到全部主键
+        rows = [
+            _passage_fields(parsed_data, nlp_result, embedding)
+            for parsed_data, nlp_result, embedding in zip(parsed_list, nlp_results, embeddings)
+        ]
+        passage_ids = db_pg.scalars(
+            insert(SieleReadingPassage).returning(
+                SieleReadingPassage.id, sort_by_parameter_order=True
+            ),
+            rows
+        ).all()
+        
+        # 题目一次 insert_many 写入 MongoDB，再批量回填 mongo_questions_id
+        mongo_ids = [None] * len(parsed_list)
+        with_questions = [i for i, p in enumerate(parsed_list) if p["questions"]]
+        if with_questions:
+            result = await db_mongo["siele_reading_questions"].insert_many(
+                [_questions_doc(passage_ids[i], parsed_list[i]) for i in with_questions]
+            )
+            for i, inserted_id in zip(with_questions, result.inserted_ids):
+                mongo_ids[i] = str(inserted_id)
+            db_pg.execute(
+                update(SieleReadingPassage),
+                [{"id": passage_ids[i], "mongo_questions_id": mongo_ids[i]} for i in with_questions]
+            )
+        
+        db_pg.commit()
+        
+        logger.info(f"✅ Bulk created {len(passage_ids)} passages")
+        
+        return [
+            _passage_response(passage_id, mongo_id, parsed_data, nlp_result)
+            for passage_id, mongo_id, parsed_data, nlp_result
+            in zip(passage_ids, mongo_ids, parsed_list, nlp_results)
+        ]
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to bulk create passages: {e}", exc_info=True)
+        db_pg.rollback()
+        raise HTTPException(500, f"批量创建失败: {str(e)}")
+
+
 @router.put("/passages/{passage_id}")
 async def update_passage_from_markup(
     passage_id: int,
@@ -218,17 +315,19 @@ async def update_passage_from_markup(
         if not passage:
             raise HTTPException(404, "文章不存在")
         
-        # ⭐ 解析 + 标注
-        parser = SieleMarkupParser(db_session=db_pg)
-        parsed_data = parser.parse(data.markup_text)
-        
-        nlp_service = get_nlp_service()
-        nlp_result = nlp_service.analyze_text(parsed_data["plain_text_es"])
+        # ⭐ 解析 + 标注 + NLP 分析（进程池）
+        parsed_data, nlp_result = await parse_and_analyze(_normalize_markup(data.markup_text))
         
-        embedding = await asyncio.to_thread(
-            get_embedding,
-            parsed_data["plain_text_es"]
+        # 正文未变化时直接复用已存向量，跳过 embedding 推理
+        text_unchanged = (
+            passage.embedding is not None
+            and passage.plain_text_es == parsed_data["plain_text_es"]
         )
+        if not text_unchanged:
+            passage.embedding = await asyncio.to_thread(
+                get_embedding,
+                parsed_data["plain_text_es"]
+            )
         
         # ⭐ 更新所有字段
         passage.title = parsed_data["title"]
@@ -238,11 +337,7 @@ async def update_passage_from_markup(
         passage.pos_distribution = parsed_data["pos_distribution"]
         passage.paragraphs = parsed_data["paragraphs"]
         passage.annotations = parsed_data["annotations"]  # ⭐ 更新标注
-        passage.embedding = embedding
-        passage.difficulty_level = nlp_service.estimate_difficulty(
-            nlp_result["pos_distribution"],
-            nlp_result["word_count"]
-        )
+        passage.difficulty_level = nlp_result["difficulty_level"]
         passage.word_count = nlp_result["word_count"]
         passage.sentence_count = nlp_result["sentence_count"]
         
@@ -2,22 +2,37 @@
 
 from datetime import datetime
 import os
+import time
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import uuid4
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Form, HTTPException, Request, UploadFile
 from fastapi.responses import Response
 from pydantic import BaseModel, Field
+from sqlalchemy import exists, insert, inspect, select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 import aiofiles
+import numpy as np
+import redis.asyncio as aioredis
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+
+try:
+    import python_multipart as multipart
+    from python_multipart.exceptions import MultipartParseError
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.exceptions import MultipartParseError
+    from multipart.multipart import parse_options_header
 
 from add_html_article.annotator import annotate_html
-from fastapi_backend.Recommendation_Algorithm.embedding_service import get_embedding
-from audio_backend.app.core.database import get_db
+from fastapi_backend.Recommendation_Algorithm.embedding_service import get_embedding, text_hash
+from audio_backend.app.core.database import SessionLocal, get_db
 from audio_backend.app.models.story_models import Story, Chapter, Paragraph
 
 # 缓存
@@ -39,6 +54,67 @@ NS_PARAGRAPHS = "stories:paragraphs"   # 段落列表/详情
 BASE_DIR = Path(__file__).resolve().parents[1]
 UPLOADS_DIR = Path(os.getenv("UPLOAD_DIR") or BASE_DIR / "uploads").resolve()
 print("SAVE uploads =>", UPLOADS_DIR)
+_UPLOADS_STR = str(UPLOADS_DIR)
+_HTTP_PREFIXES = ("http://", "https://")
+
+# 上传时每次读写的块大小：大块 = 更少的 await / 线程池往返
+UPLOAD_CHUNK = 16 * 1024 * 1024
+# 流式 multipart 里单个文本字段的上限（文本字段整段缓存在内存里）
+MULTIPART_FIELD_MAX = 1024 * 1024
+
+# embedding 专用线程池：不和 aiofiles / 其它阻塞调用抢默认线程池
+# 惰性创建、关闭后置空（同 services/parse_worker 的进程池）：同一个 app 再次经历 lifespan 时重新建
+_EMBED_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+def get_embed_executor() -> ThreadPoolExecutor:
+    global _EMBED_EXECUTOR
+    if _EMBED_EXECUTOR is None:
+        _EMBED_EXECUTOR = ThreadPoolExecutor(
+            max_workers=int(os.getenv("EMBED_WORKERS", "8")),
+            thread_name_prefix="embed",
+        )
+    return _EMBED_EXECUTOR
+
+def shutdown_embed_executor():
+    global _EMBED_EXECUTOR
+    if _EMBED_EXECUTOR is not None:
+        _EMBED_EXECUTOR.shutdown(wait=False)
+        _EMBED_EXECUTOR = None
+
+# 跨进程共享的 embedding 缓存（Redis write-through）：emb:{sha256} -> float32 bytes
+EMBED_CACHE_TTL = int(os.getenv("EMBED_CACHE_TTL", str(7 * 24 * 3600)))
+# Redis 连不上时，这么多秒内直接跳过缓存层（不再每次 GET/SET 各等一次连接超时）
+EMBED_REDIS_RETRY_AFTER = float(os.getenv("EMBED_REDIS_RETRY_AFTER", "30"))
+_embed_redis = None
+_embed_redis_down_until = 0.0
+
+def _get_embed_redis():
+    """返回二进制 Redis 客户端；处于退避期内返回 None"""
+    global _embed_redis
+    if time.monotonic() < _embed_redis_down_until:
+        return None
+    if _embed_redis is None:
+        # 单独的二进制连接池（fastapi-cache 的池开了 decode_responses），
+        # 地址和连接上限与 app.state.redis_pool 取同样的环境变量
+        pool = aioredis.ConnectionPool.from_url(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "50")),
+            socket_connect_timeout=1,
+        )
+        _embed_redis = aioredis.Redis(connection_pool=pool)
+    return _embed_redis
+
+def _embed_redis_unavailable(e: Exception) -> None:
+    """连接类错误：进入退避期，期间只打这一条日志"""
+    global _embed_redis_down_until
+    _embed_redis_down_until = time.monotonic() + EMBED_REDIS_RETRY_AFTER
+    print(f"[EMBED] redis unavailable ({e}), skipping embedding cache for {EMBED_REDIS_RETRY_AFTER:.0f}s")
+
+async def close_embed_redis():
+    global _embed_redis
+    if _embed_redis is not None:
+        await _embed_redis.aclose(close_connection_pool=True)
+        _embed_redis = None
 
 # -----------------------------
 # Pydantic Schemas
@@ -58,6 +134,10 @@ class ParagraphOut(ParagraphIn):
         from_attributes = True
 
 
+class ParagraphBulkIn(BaseModel):
+    items: List[ParagraphIn]
+
+
 class ChapterOut(BaseModel):
     id: int
     chapter_number: int
@@ -114,11 +194,81 @@ class ChapterUpdate(BaseModel):
 #        Helper utils
 # ==========================
 async def _async_get_embedding(text: Optional[str]):
-    """在线程池里跑同步 get_embedding，避免阻塞事件循环。"""
+    """
+    先查 Redis（按文本哈希，跨 worker/跨故事复用），未命中再在 embedding 专用线程池里跑
+    同步 get_embedding（其内部还有进程内 LRU），结果写回 Redis。
+    """
     if not text:
         return None
+    key = f"emb:{text_hash(text)}"
+    r = _get_embed_redis()
+    if r is not None:
+        try:
+            raw = await r.get(key)
+            if raw:
+                return np.frombuffer(raw, dtype=np.float32).tolist()
+        except (RedisConnectionError, RedisTimeoutError) as e:
+            _embed_redis_unavailable(e)
+        except Exception as e:
+            print("[EMBED] redis get failed:", e)
+
     loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, partial(get_embedding, text))
+    vec = await loop.run_in_executor(get_embed_executor(), partial(get_embedding, text))
+    # GET 刚失败进入退避期时这里拿到 None，不会再等一次 SET 的超时
+    r = _get_embed_redis()
+    if vec is not None and r is not None:
+        try:
+            await r.set(
+                key, np.asarray(vec, dtype=np.float32).tobytes(), ex=EMBED_CACHE_TTL
+            )
+        except (RedisConnectionError, RedisTimeoutError) as e:
+            _embed_redis_unavailable(e)
+        except Exception as e:
+            print("[EMBED] redis set failed:", e)
+    return vec
+
+async def _async_annotate(text: Optional[str]):
+    """在线程池里跑 annotate_html（spaCy 标注），避免阻塞事件循环。"""
+    if not text:
+        return None
+    return await asyncio.to_thread(annotate_html, text)
+
+async def _annotate_and_embed(text: Optional[str]):
+    """标注与向量并发计算；任一失败按 None 处理（与原来的容错一致）。"""
+    ann_val, vec = await asyncio.gather(
+        _async_annotate(text), _async_get_embedding(text), return_exceptions=True
+    )
+    if isinstance(ann_val, Exception):
+        print(f"[ANNOTATE] failed: {ann_val}")
+        ann_val = None
+    if isinstance(vec, Exception):
+        print(f"[EMBED] failed: {vec}")
+        vec = None
+    return ann_val, vec
+
+def _store_paragraph_enrichment(paragraph_id: int, text: str, ann_val: Any, vec: Any) -> bool:
+    """
+    后台任务用独立 session 回写标注和向量；正文在此期间又被改过则放弃（由新的任务负责）。
+    与 update_paragraph 一样按 _norm_text 比较：只改了首尾空白时不会重新排任务，这里也不能丢弃结果。
+    """
+    with SessionLocal() as db:
+        p = db.get(Paragraph, paragraph_id)
+        if p is None or _norm_text(p.original_text) != _norm_text(text):
+            return False
+        p.annotations = _to_annotations_json(ann_val)
+        p.semantic_vector = vec
+        db.commit()
+        return True
+
+async def _fill_vector(paragraph_id: int, story_id: int, chapter_id: int, text: str):
+    ann_val, vec = await _annotate_and_embed(text)
+    try:
+        stored = await asyncio.to_thread(_store_paragraph_enrichment, paragraph_id, text, ann_val, vec)
+    except Exception as e:
+        print(f"WARN: fill vector failed for paragraph {paragraph_id}: {e}")
+        return
+    if stored:
+        await _invalidate_paragraph_cache(story_id, chapter_id)
 
 def _to_annotations_json(val: Optional[Any]) -> List[Dict[str, Any]]:
     if val is None:
@@ -133,28 +283,46 @@ def _to_annotations_json(val: Optional[Any]) -> List[Dict[str, Any]]:
 
 def _url_to_abs_path(u: Optional[str]) -> Optional[Path]:
     """仅处理本地静态文件：/files/... 其它（http/https 或 None）直接忽略。"""
-    if not u or u.startswith(("http://", "https://")):
+    if not u or u.startswith(_HTTP_PREFIXES):
         return None
     raw = u.lstrip("/")
     if not raw.startswith("files/"):
         return None
-    rel = raw[len("files/") :]
-    p = (UPLOADS_DIR / rel).resolve()
-    if str(p).startswith(str(UPLOADS_DIR)):
+    rel = raw[6:]
+    p = UPLOADS_DIR / rel
+    # 只有可能越界时才 resolve（会碰磁盘）；常见情况就是纯字符串拼接
+    if ".." in rel:
+        p = p.resolve()
+    # 前缀检查仍然保留：rel 以 "/" 开头时拼接结果会变成绝对路径
+    if str(p).startswith(_UPLOADS_STR):
         return p
     return None
 
-def _delete_files_by_urls(urls: List[Optional[str]]) -> List[str]:
-    removed: List[str] = []
-    for u in set(filter(None, urls)):
+def _safe_unlink(p: Path) -> bool:
+    if not p.exists():
+        return False
+    try:
+        p.unlink()
+        return True
+    except Exception as e:
+        print("WARN: unlink failed:", p, e)
+        return False
+
+async def _delete_files_by_urls(urls: List[Optional[str]]) -> List[Path]:
+    # 路径解析在内存里做；unlink 批量丢进线程池并发执行，不阻塞事件循环
+    paths: List[Path] = []
+    for u in {u for u in urls if u}:
         p = _url_to_abs_path(u)
-        if p and p.exists():
-            try:
-                p.unlink()
-                removed.append(str(p))
-            except Exception as e:
-                print("WARN: unlink failed:", p, e)
-    return removed
+        if p is None:
+            continue
+        paths.append(p)
+    if not paths:
+        return []
+    results = await asyncio.gather(*(asyncio.to_thread(_safe_unlink, p) for p in paths))
+    return [p for p, ok in zip(paths, results) if ok]
+
+def _norm_text(s: Optional[str]) -> str:
+    return (s or "").strip()
 
 def _as_bool(v: Optional[str], default: bool = False) -> bool:
     if v is None:
@@ -173,6 +341,15 @@ def _normalize_files_url(u: Optional[str]) -> Optional[str]:
         return "/files/" + raw[len("uploads/") :]
     return f"/files/{raw}"
 
+def _new_upload_path(filename: Optional[str], subdir: str = "images") -> Tuple[Path, Path]:
+    """uploads/{subdir}/YYYY/MM/DD/{uuid}{ext}，返回 (相对路径, 绝对路径)"""
+    ext = os.path.splitext(filename or "")[1].lower() or ".png"
+    today = datetime.now().strftime("%Y/%m/%d")
+    rel_path = Path(subdir) / today / f"{uuid4().hex}{ext}"
+    abs_path = (UPLOADS_DIR / rel_path).resolve()
+    abs_path.parent.mkdir(parents=True, exist_ok=True)
+    return rel_path, abs_path
+
 async def _save_upload_async(file: Optional[UploadFile], subdir: str = "images") -> Optional[str]:
     if not file:
         print("[UPLOAD] no file received")
@@ -181,15 +358,11 @@ async def _save_upload_async(file: Optional[UploadFile], subdir: str = "images")
         file.file.seek(0)
     except Exception:
         pass
-    ext = os.path.splitext(file.filename or "")[1].lower() or ".png"
-    today = datetime.now().strftime("%Y/%m/%d")
-    rel_path = Path(subdir) / today / f"{uuid4().hex}{ext}"
-    abs_path = (UPLOADS_DIR / rel_path).resolve()
-    abs_path.parent.mkdir(parents=True, exist_ok=True)
+    rel_path, abs_path = _new_upload_path(file.filename, subdir)
     print(f"[UPLOAD] saving -> {abs_path} (name={file.filename}, ct={getattr(file, 'content_type', '')})")
     async with aiofiles.open(abs_path, "wb") as f:
         while True:
-            chunk = await file.read(1024 * 1024)
+            chunk = await file.read(UPLOAD_CHUNK)
             if not chunk:
                 break
             await f.write(chunk)
@@ -197,6 +370,129 @@ async def _save_upload_async(file: Optional[UploadFile], subdir: str = "images")
     print(f"[UPLOAD] saved url: {url}")
     return url
 
+async def _discard_uploads(f, urls: List[Optional[str]]) -> None:
+    """出错时关掉写了一半的文件，并删除本次请求已落盘的全部文件"""
+    if f is not None:
+        try:
+            await f.close()
+        except Exception:
+            pass
+    await _delete_files_by_urls(urls)
+
+async def _stream_multipart(
+    request: Request,
+    subdir: str = "images",
+    file_fields: Tuple[str, ...] = ("cover_image",),
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    直接消费 request.stream() 解析 multipart：文件块边收边写入 uploads/，
+    不经过 UploadFile 的 SpooledTemporaryFile（省掉一次临时落盘）。
+    只有 file_fields 里的字段（每个字段只取第一个文件）会落盘，其它文件块直接丢弃；
+    解析失败 / 客户端断开等任何异常都会删掉已写入的文件。
+    返回 (文本字段, 文件字段 -> /files/... URL)
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(400, "multipart/form-data required")
+
+    # parser 的回调是同步的：先记录事件，每写入一块后再异步处理
+    events: List[Tuple[str, Any]] = []
+    part_headers: Dict[bytes, bytes] = {}
+    header_field = bytearray()
+    header_value = bytearray()
+
+    def on_part_begin():
+        part_headers.clear()
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        part_headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        _, options = parse_options_header(part_headers.get(b"content-disposition", b""))
+        events.append(("begin", options))
+
+    def on_part_data(data: bytes, start: int, end: int):
+        events.append(("data", data[start:end]))
+
+    def on_part_end():
+        events.append(("end", None))
+
+    parser = multipart.MultipartParser(
+        params[b"boundary"],
+        callbacks={
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
+    )
+
+    fields: Dict[str, str] = {}
+    files: Dict[str, str] = {}
+    name = ""
+    mode = "field"  # field | file | skip（空文件字段、非 file_fields 的文件、同名的第二个文件）
+    buf = bytearray()
+    f = None
+    url = None  # 当前（或最后一个）写入的文件，出错时连同 files 一起删除
+    part_open = False  # 收到 part 开头但还没收到结尾
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, payload in events:
+                if kind == "begin":
+                    part_open = True
+                    name = payload.get(b"name", b"").decode()
+                    filename = payload.get(b"filename")
+                    if filename is None:
+                        mode = "field"
+                        buf = bytearray()
+                    elif not filename or name not in file_fields or name in files:
+                        mode = "skip"
+                    else:
+                        mode = "file"
+                        rel_path, abs_path = _new_upload_path(filename.decode(), subdir)
+                        url = f"/files/{rel_path.as_posix()}"
+                        print(f"[UPLOAD] streaming -> {abs_path} (name={filename.decode()})")
+                        f = await aiofiles.open(abs_path, "wb")
+                elif kind == "data":
+                    if mode == "file":
+                        await f.write(payload)
+                    elif mode == "field":
+                        if len(buf) + len(payload) > MULTIPART_FIELD_MAX:
+                            raise HTTPException(413, f"form field '{name}' too large")
+                        buf.extend(payload)
+                else:
+                    part_open = False
+                    if mode == "file":
+                        await f.close()
+                        f = None
+                        files[name] = url
+                    elif mode == "field":
+                        fields[name] = buf.decode("utf-8")
+            events.clear()
+        parser.finalize()
+        # finalize 不会因为请求体被截断而报错：停在某个 part 中间就是不完整的上传
+        if part_open:
+            raise HTTPException(400, "incomplete multipart body")
+    except (MultipartParseError, UnicodeDecodeError) as e:
+        await _discard_uploads(f, [*files.values(), url])
+        raise HTTPException(400, f"malformed multipart body: {e}")
+    except BaseException:
+        await _discard_uploads(f, [*files.values(), url])
+        raise
+    return fields, files
+
 def _paragraph_to_dict(p: Paragraph) -> Dict[str, Any]:
     return {
         "id": p.id,
@@ -224,6 +520,13 @@ def _chapters_for_story(db: Session, story_id: int) -> List[Chapter]:
         .all()
     )
 
+def _get_chapter(db: Session, story_id: int, chapter_id: int) -> Optional[Chapter]:
+    # 主键查找走 identity map；章节不属于该故事时视同不存在
+    ch = db.get(Chapter, chapter_id)
+    if ch is None or ch.story_id != story_id:
+        return None
+    return ch
+
 def _story_to_dict(db: Session, s: Story, include_chapters: bool = True) -> Dict[str, Any]:
     data: Dict[str, Any] = {
         "id": s.id,
@@ -235,36 +538,71 @@ def _story_to_dict(db: Session, s: Story, include_chapters: bool = True) -> Dict
         "chapters": [],
     }
     if include_chapters:
-        chapters = getattr(s, "chapters", None) or _chapters_for_story(db, s.id)
+        # 已加载（哪怕是空列表）就直接用，只有未加载时才查库
+        if "chapters" in inspect(s).unloaded:
+            chapters = _chapters_for_story(db, s.id)
+        else:
+            chapters = s.chapters
         data["chapters"] = [_chapter_to_dict(ch) for ch in chapters]
     return data
 
 def _chapter_number_conflict(db: Session, story_id: int, number: int, exclude_id: Optional[int] = None) -> bool:
-    q = db.query(Chapter.id).filter(Chapter.story_id == story_id, Chapter.chapter_number == int(number))
+    conds = [Chapter.story_id == story_id, Chapter.chapter_number == int(number)]
     if exclude_id:
-        q = q.filter(Chapter.id != exclude_id)
-    return db.query(q.exists()).scalar()
+        conds.append(Chapter.id != exclude_id)
+    return bool(db.execute(select(exists().where(*conds))).scalar())
 
 # ==========================
-# 缓存失效工具（写操作后调用）
+# 缓存键 / 失效工具（写操作后调用）
 # ==========================
-async def _invalidate_all_story_cache():
-    # 简单粗暴：写后全清相关空间。吞掉异常避免影响主流程。
+def _scoped(namespace: str, *ids: Any) -> str:
+    """带实体 id 的命名空间前缀，如 stories:paragraphs:3:12（故事 3 / 章节 12）"""
+    return ":".join([namespace, *(str(i) for i in ids)])
+
+def _kb(func, namespace: str = "", *, request=None, response=None, args=(), kwargs=None):
+    """
+    紧凑缓存键：{namespace}:{story_id}:{chapter_id}:{函数名}。
+    不再对参数做摘要；这些接口除了路径 id 没有别的入参。
+    id 在前，清理时按 _scoped(...) 前缀删即可精确到故事/章节。
+    """
+    kwargs = kwargs or {}
+    return f"{namespace}:{kwargs.get('story_id', '')}:{kwargs.get('chapter_id', '')}:{func.__name__}"
+
+async def _invalidate_cache(*namespaces: str):
+    # 并发清理给定命名空间（只等一个 RTT）。吞掉异常避免影响主流程。
     try:
-        await FastAPICache.clear(namespace=NS_STORIES)
-        await FastAPICache.clear(namespace=NS_STORY_DETAIL)
-        await FastAPICache.clear(namespace=NS_CHAPTERS)
-        await FastAPICache.clear(namespace=NS_PARAGRAPHS)
+        results = await asyncio.gather(
+            *(FastAPICache.clear(namespace=ns) for ns in namespaces),
+            return_exceptions=True,
+        )
+        for ns, r in zip(namespaces, results):
+            if isinstance(r, Exception):
+                print("[CACHE] clear failed:", ns, r)
     except Exception as e:
         print("[CACHE] clear failed:", e)
 
+async def _invalidate_story_cache(story_id: int):
+    # 故事本身变化：列表 + 该故事详情
+    await _invalidate_cache(NS_STORIES, _scoped(NS_STORY_DETAIL, story_id))
+
+async def _invalidate_chapter_cache(story_id: int, chapter_id: Optional[int] = None):
+    # 章节变化：列表和故事详情都内嵌章节，一并清理；删除章节时连带其段落
+    namespaces = [NS_STORIES, _scoped(NS_STORY_DETAIL, story_id), _scoped(NS_CHAPTERS, story_id)]
+    if chapter_id is not None:
+        namespaces.append(_scoped(NS_PARAGRAPHS, story_id, chapter_id))
+    await _invalidate_cache(*namespaces)
+
+async def _invalidate_paragraph_cache(story_id: int, chapter_id: int):
+    await _invalidate_cache(_scoped(NS_PARAGRAPHS, story_id, chapter_id))
+
 # ==========================
 #      Story JSON CRUD
 # ==========================
 @router.get("/", response_model=List[StoryOut])
-@cache(expire=60, namespace=NS_STORIES)
+@cache(expire=60, namespace=NS_STORIES, key_builder=_kb)
 def list_stories(db: Session = Depends(get_db)):
-    stories = db.query(Story).order_by(Story.id.desc()).all()
+    # 章节用一条 IN() 查询预加载，避免每个故事再查一次（N+1）
+    stories = db.query(Story).options(selectinload(Story.chapters)).order_by(Story.id.desc()).all()
     return [_story_to_dict(db, s, include_chapters=True) for s in stories]
 
 @router.post("/", response_model=StoryOut)
@@ -280,22 +618,23 @@ async def create_story(payload: StoryIn, db: Session = Depends(get_db)):
         translated_summary=payload.translated_summary,
     )
     db.add(s)
+    db.flush()  # INSERT ... RETURNING id, created_at（Story 开了 eager_defaults），无需 refresh
+    data = _story_to_dict(db, s, include_chapters=False)  # 新故事没有章节
     db.commit()
-    db.refresh(s)
-    await _invalidate_all_story_cache()
-    return _story_to_dict(db, s, include_chapters=True)
+    await _invalidate_cache(NS_STORIES)
+    return data
 
 @router.get("/{story_id}", response_model=StoryOut)
-@cache(expire=60, namespace=NS_STORY_DETAIL)
+@cache(expire=60, namespace=NS_STORY_DETAIL, key_builder=_kb)
 def get_story(story_id: int, db: Session = Depends(get_db)):
-    s = db.query(Story).filter(Story.id == story_id).first()
+    s = db.get(Story, story_id, options=[selectinload(Story.chapters)])
     if not s:
         raise HTTPException(404, "Story not found")
     return _story_to_dict(db, s, include_chapters=True)
 
 @router.put("/{story_id}", response_model=StoryOut)
 async def update_story(story_id: int, payload: StoryUpdate, db: Session = Depends(get_db)):
-    s = db.query(Story).filter(Story.id == story_id).first()
+    s = db.get(Story, story_id)
     if not s:
         raise HTTPException(404, "Story not found")
 
@@ -308,43 +647,49 @@ async def update_story(story_id: int, payload: StoryUpdate, db: Session = Depend
     if payload.translated_summary is not None:
         s.translated_summary = payload.translated_summary
 
+    # 提交前用内存里的值组装响应：commit 会让属性过期，refresh 又要多一次 SELECT
+    db.flush()
+    data = _story_to_dict(db, s, include_chapters=True)
     db.commit()
-    db.refresh(s)
-    await _invalidate_all_story_cache()
-    return _story_to_dict(db, s, include_chapters=True)
+    await _invalidate_story_cache(story_id)
+    return data
 
 @router.delete("/{story_id}", status_code=204)
 async def delete_story(story_id: int, db: Session = Depends(get_db)):
-    s = db.query(Story).filter(Story.id == story_id).first()
+    s = db.get(Story, story_id)
     if not s:
         raise HTTPException(404, "Story not found")
 
-    urls: List[Optional[str]] = []
-    if getattr(s, "cover_image_url", None):
+    # 只取章节图片 URL，不构造完整的 Chapter 对象
+    urls: List[Optional[str]] = list(
+        db.scalars(select(Chapter.image_url).where(Chapter.story_id == story_id, Chapter.image_url.isnot(None)))
+    )
+    if s.cover_image_url:
         urls.append(s.cover_image_url)
-    chapters = _chapters_for_story(db, story_id)
-    for ch in chapters:
-        if getattr(ch, "image_url", None):
-            urls.append(ch.image_url)
 
-    db.query(Chapter).filter(Chapter.story_id == story_id).delete()
+    # 章节/段落依赖外键 ON DELETE CASCADE（relationship 设了 passive_deletes）
     db.delete(s)
     db.commit()
 
-    removed = _delete_files_by_urls(urls)
+    removed = await _delete_files_by_urls(urls)
     if removed:
-        print("Deleted files:", removed)
+        print("Deleted files:", [str(p) for p in removed])
 
-    await _invalidate_all_story_cache()
+    await _invalidate_cache(
+        NS_STORIES,
+        _scoped(NS_STORY_DETAIL, story_id),
+        _scoped(NS_CHAPTERS, story_id),
+        _scoped(NS_PARAGRAPHS, story_id),  # 该故事所有章节的段落
+    )
     return Response(status_code=204)
 
 # ==========================
 #      Chapter JSON CRUD
 # ==========================
 @router.get("/{story_id}/chapters", response_model=List[ChapterOut])
-@cache(expire=60, namespace=NS_CHAPTERS)
+@cache(expire=60, namespace=NS_CHAPTERS, key_builder=_kb)
 def list_chapters(story_id: int, db: Session = Depends(get_db)):
-    s = db.query(Story).filter(Story.id == story_id).first()
+    s = db.get(Story, story_id)
     if not s:
         raise HTTPException(404, "Story not found")
     chapters = _chapters_for_story(db, story_id)
@@ -352,7 +697,7 @@ def list_chapters(story_id: int, db: Session = Depends(get_db)):
 
 @router.post("/{story_id}/chapters", response_model=ChapterOut)
 async def create_chapter(story_id: int, payload: ChapterIn, db: Session = Depends(get_db)):
-    s = db.query(Story).filter(Story.id == story_id).first()
+    s = db.get(Story, story_id)
     if not s:
         raise HTTPException(404, "Story not found")
 
@@ -380,13 +725,13 @@ async def create_chapter(story_id: int, payload: ChapterIn, db: Session = Depend
         raise HTTPException(status_code=409, detail=f"章节编号 {num} 已存在")
 
     db.refresh(ch)
-    await _invalidate_all_story_cache()
+    await _invalidate_chapter_cache(story_id)
     return _chapter_to_dict(ch)
 
 @router.get("/{story_id}/chapters/{chapter_id}", response_model=ChapterOut)
-@cache(expire=60, namespace=NS_CHAPTERS)
+@cache(expire=60, namespace=NS_CHAPTERS, key_builder=_kb)
 def get_chapter(story_id: int, chapter_id: int, db: Session = Depends(get_db)):
-    ch = db.query(Chapter).filter(Chapter.id == chapter_id, Chapter.story_id == story_id).first()
+    ch = _get_chapter(db, story_id, chapter_id)
     if not ch:
         raise HTTPException(404, "Chapter not found")
     return _chapter_to_dict(ch)
@@ -395,7 +740,7 @@ def get_chapter(story_id: int, chapter_id: int, db: Session = Depends(get_db)):
 async def update_chapter(
     story_id: int, chapter_id: int, payload: ChapterUpdate, db: Session = Depends(get_db)
 ):
-    ch = db.query(Chapter).filter(Chapter.id == chapter_id, Chapter.story_id == story_id).first()
+    ch = _get_chapter(db, story_id, chapter_id)
     if not ch:
         raise HTTPException(404, "Chapter not found")
 
@@ -421,21 +766,21 @@ async def update_chapter(
         raise HTTPException(status_code=409, detail="章节编号冲突")
 
     db.refresh(ch)
-    await _invalidate_all_story_cache()
+    await _invalidate_chapter_cache(story_id)
     return _chapter_to_dict(ch)
 
 @router.delete("/{story_id}/chapters/{chapter_id}", status_code=204)
 async def delete_chapter(story_id: int, chapter_id: int, db: Session = Depends(get_db)):
-    ch = db.query(Chapter).filter(Chapter.id == chapter_id, Chapter.story_id == story_id).first()
+    ch = _get_chapter(db, story_id, chapter_id)
     if not ch:
         raise HTTPException(404, "Chapter not found")
 
     url = ch.image_url
     db.delete(ch)
     db.commit()
-    _delete_files_by_urls([url])
+    await _delete_files_by_urls([url])
 
-    await _invalidate_all_story_cache()
+    await _invalidate_chapter_cache(story_id, chapter_id)
     return Response(status_code=204)
 
 # ==========================
@@ -458,10 +803,44 @@ async def create_story_with_image(
         translated_summary=translated_summary,
     )
     db.add(s)
+    db.flush()  # INSERT ... RETURNING id, created_at（Story 开了 eager_defaults），无需 refresh
+    data = _story_to_dict(db, s, include_chapters=False)  # 新故事没有章节
     db.commit()
-    db.refresh(s)
-    await _invalidate_all_story_cache()
-    return _story_to_dict(db, s, include_chapters=True)
+    await _invalidate_cache(NS_STORIES)
+    return data
+
+@router.post("/with-image/stream", response_model=StoryOut)
+async def create_story_with_image_stream(request: Request, db: Session = Depends(get_db)):
+    """
+    与 /with-image 字段相同（title / summary / translated_summary / cover_image），
+    但封面直接从请求流写到 uploads/，大文件只落盘一次。
+    """
+    fields, files = await _stream_multipart(request)
+    cover_url = files.get("cover_image")
+    title = (fields.get("title") or "").strip()
+    if not title:
+        await _delete_files_by_urls([cover_url])
+        raise HTTPException(400, "title is required")
+
+    print(f"[STORY] create with-image (stream), file?: {bool(cover_url)}")
+    s = Story(
+        title=title,
+        cover_image_url=cover_url,
+        summary=fields.get("summary"),
+        translated_summary=fields.get("translated_summary"),
+    )
+    try:
+        db.add(s)
+        db.flush()  # INSERT ... RETURNING id, created_at（Story 开了 eager_defaults），无需 refresh
+        data = _story_to_dict(db, s, include_chapters=False)  # 新故事没有章节
+        db.commit()
+    except Exception:
+        # 没落库的封面不能留在 uploads/ 里
+        db.rollback()
+        await _delete_files_by_urls([cover_url])
+        raise
+    await _invalidate_cache(NS_STORIES)
+    return data
 
 @router.put("/{story_id}/with-image", response_model=StoryOut)
 async def update_story_with_image(
@@ -473,7 +852,7 @@ async def update_story_with_image(
     keep_existing_image: Optional[str] = Form("true"),
     db: Session = Depends(get_db),
 ):
-    s = db.query(Story).filter(Story.id == story_id).first()
+    s = db.get(Story, story_id)
     if not s:
         raise HTTPException(404, "Story not found")
 
@@ -492,10 +871,12 @@ async def update_story_with_image(
         if not keep:
             s.cover_image_url = None
 
+    # 提交前用内存里的值组装响应：commit 会让属性过期，refresh 又要多一次 SELECT
+    db.flush()
+    data = _story_to_dict(db, s, include_chapters=True)
     db.commit()
-    db.refresh(s)
-    await _invalidate_all_story_cache()
-    return _story_to_dict(db, s, include_chapters=True)
+    await _invalidate_story_cache(story_id)
+    return data
 
 @router.post("/{story_id}/chapters/with-image", response_model=ChapterOut)
 async def create_chapter_with_image(
@@ -506,7 +887,7 @@ async def create_chapter_with_image(
     chapter_image: Optional[UploadFile] = File(None),
     db: Session = Depends(get_db),
 ):
-    s = db.query(Story).filter(Story.id == story_id).first()
+    s = db.get(Story, story_id)
     if not s:
         raise HTTPException(404, "Story not found")
 
@@ -534,7 +915,7 @@ async def create_chapter_with_image(
         raise HTTPException(status_code=409, detail=f"章节编号 {chapter_number} 已存在")
 
     db.refresh(ch)
-    await _invalidate_all_story_cache()
+    await _invalidate_chapter_cache(story_id)
     return _chapter_to_dict(ch)
 
 @router.put("/{story_id}/chapters/{chapter_id}/with-image", response_model=ChapterOut)
@@ -548,7 +929,7 @@ async def update_chapter_with_image(
     keep_existing_image: Optional[str] = Form("true"),
     db: Session = Depends(get_db),
 ):
-    ch = db.query(Chapter).filter(Chapter.id == chapter_id, Chapter.story_id == story_id).first()
+    ch = _get_chapter(db, story_id, chapter_id)
     if not ch:
         raise HTTPException(404, "Chapter not found")
 
@@ -582,16 +963,16 @@ async def update_chapter_with_image(
         raise HTTPException(status_code=409, detail="章节编号冲突")
 
     db.refresh(ch)
-    await _invalidate_all_story_cache()
+    await _invalidate_chapter_cache(story_id)
     return _chapter_to_dict(ch)
 
 # ==========================
 #         Paragraphs
 # ==========================
 @router.get("/{story_id}/chapters/{chapter_id}/paragraphs", response_model=List[ParagraphOut])
-@cache(expire=60, namespace=NS_PARAGRAPHS)
+@cache(expire=60, namespace=NS_PARAGRAPHS, key_builder=_kb)
 def list_paragraphs(story_id: int, chapter_id: int, db: Session = Depends(get_db)):
-    ch = db.query(Chapter).filter_by(id=chapter_id, story_id=story_id).first()
+    ch = _get_chapter(db, story_id, chapter_id)
     if not ch:
         raise HTTPException(404, "Chapter not found")
     rows = (
@@ -607,26 +988,21 @@ async def create_paragraph(
     story_id: int,
     chapter_id: int,
     body: ParagraphIn,
+    background: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
-    ch = db.query(Chapter).filter_by(id=chapter_id, story_id=story_id).first()
+    ch = _get_chapter(db, story_id, chapter_id)
     if not ch:
         raise HTTPException(404, "Chapter not found")
 
-    # 生成语义向量 + 注释
-    try:
-        ann_val = annotate_html(body.original_text) if body.original_text else None
-    except Exception as e:
-        print(f"[ANNOTATE] failed: {e}")
-        ann_val = None
-
+    # 先落库再返回；标注和向量在响应发出后由后台任务补上（客户端可看 has_vector）
     p = Paragraph(
         chapter_id=chapter_id,
         paragraph_number=int(body.paragraph_number),
         original_text=body.original_text,
         translation_text=body.translation_text or "",
-        semantic_vector=await _async_get_embedding(body.original_text),
-        annotations=_to_annotations_json(ann_val),
+        semantic_vector=None,
+        annotations=[],
     )
     db.add(p)
     try:
@@ -643,15 +1019,64 @@ async def create_paragraph(
             },
         )
     db.refresh(p)
-    await _invalidate_all_story_cache()
+    background.add_task(_fill_vector, p.id, story_id, chapter_id, body.original_text)
+    await _invalidate_paragraph_cache(story_id, chapter_id)
     return _paragraph_to_dict(p)
 
+@router.post("/{story_id}/chapters/{chapter_id}/paragraphs/bulk", response_model=List[ParagraphOut])
+async def create_paragraphs_bulk(
+    story_id: int,
+    chapter_id: int,
+    body: ParagraphBulkIn,
+    db: Session = Depends(get_db),
+):
+    """一次导入整章段落：标注/向量全部并发生成，一条 INSERT 写入，一次提交。"""
+    ch = _get_chapter(db, story_id, chapter_id)
+    if not ch:
+        raise HTTPException(404, "Chapter not found")
+    if not body.items:
+        return []
+
+    results = await asyncio.gather(*(_annotate_and_embed(b.original_text) for b in body.items))
+
+    rows = [
+        dict(
+            chapter_id=chapter_id,
+            paragraph_number=int(b.paragraph_number),
+            original_text=b.original_text,
+            translation_text=b.translation_text or "",
+            semantic_vector=vec,
+            annotations=_to_annotations_json(ann_val),
+        )
+        for b, (ann_val, vec) in zip(body.items, results)
+    ]
+    try:
+        created = db.scalars(
+            insert(Paragraph).returning(Paragraph, sort_by_parameter_order=True), rows
+        ).all()
+        out = [_paragraph_to_dict(p) for p in created]
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "error": "duplicate_paragraph_number",
+                "message": "段落编号重复或已存在",
+                "chapter_id": chapter_id,
+                "paragraph_numbers": [int(b.paragraph_number) for b in body.items],
+            },
+        )
+    await _invalidate_paragraph_cache(story_id, chapter_id)
+    return out
+
 @router.put("/{story_id}/chapters/{chapter_id}/paragraphs/{paragraph_id}", response_model=ParagraphOut)
 async def update_paragraph(
     story_id: int,
     chapter_id: int,
     paragraph_id: int,
     body: ParagraphIn,
+    background: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
     p = (
@@ -667,24 +1092,23 @@ async def update_paragraph(
     if not p:
         raise HTTPException(404, "Paragraph not found")
 
-    original_changed = (body.original_text != p.original_text)
+    # 只有规范化后的正文真的变了才重新生成向量和标注
+    original_changed = _norm_text(body.original_text) != _norm_text(p.original_text)
 
     p.paragraph_number = int(body.paragraph_number)
     p.original_text = body.original_text
     p.translation_text = body.translation_text or ""  # NOT NULL 兜底
 
     if original_changed:
-        p.semantic_vector = await _async_get_embedding(body.original_text)
-        try:
-            ann_val = annotate_html(body.original_text) if body.original_text else None
-        except Exception as e:
-            print(f"[ANNOTATE] failed: {e}")
-            ann_val = None
-        p.annotations = _to_annotations_json(ann_val)
+        # 旧的标注/向量已失效，先清空，后台任务重新生成
+        p.semantic_vector = None
+        p.annotations = []
 
     db.commit()
     db.refresh(p)
-    await _invalidate_all_story_cache()
+    if original_changed:
+        background.add_task(_fill_vector, p.id, story_id, chapter_id, body.original_text)
+    await _invalidate_paragraph_cache(story_id, chapter_id)
     return _paragraph_to_dict(p)
 
 @router.delete("/{story_id}/chapters/{chapter_id}/paragraphs/{paragraph_id}", status_code=204)
@@ -709,17 +1133,17 @@ async def delete_paragraph(
 
     db.delete(p)
     db.commit()
-    await _invalidate_all_story_cache()
+    await _invalidate_paragraph_cache(story_id, chapter_id)
     return Response(status_code=204)
 
 @router.get("/{story_id}/chapters/{chapter_id}/paragraphs/used-numbers", response_model=List[int])
-@cache(expire=60, namespace=NS_PARAGRAPHS)
+@cache(expire=60, namespace=NS_PARAGRAPHS, key_builder=_kb)
 def list_used_paragraph_numbers(
     story_id: int,
     chapter_id: int,
     db: Session = Depends(get_db)
 ):
-    ch = db.query(Chapter).filter_by(id=chapter_id, story_id=story_id).first()
+    ch = _get_chapter(db, story_id, chapter_id)
     if not ch:
         raise HTTPException(404, "Chapter not found")
     rows = (
@@ -43,7 +43,7 @@ async def list_countries(db: Session = Depends(get_db), current_user=Depends(get
 
 @router.get("/countries/{country_id}")
 async def get_country(country_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_admin_user)):
-    country = db.query(Country).filter(Country.id == country_id).first()
+    country = db.get(Country, country_id)
     if not country:
         raise HTTPException(status_code=404, detail="Country not found")
     return {
@@ -61,7 +61,7 @@ async def get_country(country_id: int, db: Session = Depends(get_db), current_us
 
 @router.put("/countries/{country_id}")
 async def update_country(country_id: int, request: Request, db: Session = Depends(get_db), current_user=Depends(get_current_admin_user)):
-    country = db.query(Country).filter(Country.id == country_id).first()
+    country = db.get(Country, country_id)
     if not country:
         raise HTTPException(status_code=404, detail="Country not found")
 
@@ -76,7 +76,7 @@ async def update_country(country_id: int, request: Request, db: Session = Depend
 
 @router.delete("/countries/{country_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_country(country_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_admin_user)):
-    country = db.query(Country).filter(Country.id == country_id).first()
+    country = db.get(Country, country_id)
     if not country:
         raise HTTPException(status_code=404, detail="Country not found")
     db.delete(country)
@@ -118,7 +118,7 @@ async def list_cities(country_id: int, db: Session = Depends(get_db), current_us
 
 @router.get("/cities/{city_id}")
 async def get_city(city_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_admin_user)):
-    city = db.query(City).filter(City.id == city_id).first()
+    city = db.get(City, city_id)
     if not city:
         raise HTTPException(status_code=404, detail="City not found")
     return {
@@ -136,7 +136,7 @@ async def get_city(city_id: int, db: Session = Depends(get_db), current_user=Dep
 
 @router.put("/cities/{city_id}")
 async def update_city(city_id: int, request: Request, db: Session = Depends(get_db), current_user=Depends(get_current_admin_user)):
-    city = db.query(City).filter(City.id == city_id).first()
+    city = db.get(City, city_id)
     if not city:
         raise HTTPException(status_code=404, detail="City not found")
 
@@ -151,7 +151,7 @@ async def update_city(city_id: int, request: Request, db: Session = Depends(get_
 
 @router.delete("/cities/{city_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_city(city_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_admin_user)):
-    city = db.query(City).filter(City.id == city_id).first()
+    city = db.get(City, city_id)
     if not city:
         raise HTTPException(status_code=404, detail="City not found")
     db.delete(city)
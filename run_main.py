@@ -1,11 +1,13 @@
 # run_main.py
 import os
 import sys
+import time
+from functools import lru_cache
 from pathlib import Path
 
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -28,14 +30,74 @@ from fastapi_backend.main import get_app as get_user_app
 
 # 导入 MongoDB 初始化函数
 from audio_backend.app.core.mongodb import init_mongodb, close_mongodb
+from services.parse_worker import shutdown_parse_pool
+from fastapi_backend.routes.story_routes import close_embed_redis, shutdown_embed_executor
 
+class RequestTimingASGI:
+    """
+    纯 ASGI 计时中间件：在响应头里加 x-response-time。
+    不用 BaseHTTPMiddleware / @app.middleware("http")——那种写法会把响应体
+    经内存通道转一手，并为每个请求包一层 Request/Response。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                elapsed = (time.perf_counter() - start) * 1000
+                headers.append((b"x-response-time", f"{elapsed:.2f}ms".encode()))
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+# 合并后 audio 子应用的 GET / 排在路由表最前面，实际返回的一直是它的响应体
+_HEALTH_BODY = b'{"status":"running"}'
+_HEALTH_HEADERS = [
+    (b"content-type", b"application/json"),
+    (b"content-length", str(len(_HEALTH_BODY)).encode()),
+]
+
+
+class HealthASGI:
+    """
+    最外层的健康检查快速通道：GET / 直接回 200，
+    不经过 Session / CORS 等中间件，也不进路由匹配（探针每隔几秒就打一次）。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "GET" and scope["path"] == "/":
+            await send({"type": "http.response.start", "status": 200, "headers": _HEALTH_HEADERS})
+            await send({"type": "http.response.body", "body": _HEALTH_BODY})
+            return
+        await self.app(scope, receive, send)
+
+
+# 进程内只构建一次：重复 import / 调用都拿到同一个 app（配合 gunicorn --preload 时
+# 在 master 里构建好，fork 出的 worker 共享这些页面）
+@lru_cache(maxsize=1)
 def create_unified_app() -> FastAPI:
     load_dotenv()
 
     SECRET_KEY = os.getenv("SECRET_KEY")
     REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
     MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
     MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "siele_app")
+    # 不需要 MongoDB 的部署（只跑故事/旅游等接口）设 ENABLE_MONGO=0，不再另起一份入口
+    ENABLE_MONGO = os.getenv("ENABLE_MONGO", "1").lower() in ("1", "true", "yes")
     
     if not SECRET_KEY:
         raise RuntimeError("Missing SECRET_KEY in .env")
@@ -45,7 +107,7 @@ def create_unified_app() -> FastAPI:
     user_app = get_user_app()
 
     # 2) 创建总 app & 中间件
-    app = FastAPI(title="LingualAudio Unified API")
+    app = FastAPI(title="LingualAudio Unified API", default_response_class=ORJSONResponse)
 
     app.add_middleware(
         CORSMiddleware,
@@ -60,20 +122,38 @@ def create_unified_app() -> FastAPI:
         session_cookie="session",
         max_age=86400,
     )
+    # 需要观察耗时时再开（RESPONSE_TIMING=1）；请求/响应钩子一律写成纯 ASGI
+    if os.getenv("RESPONSE_TIMING", "").lower() in ("1", "true", "yes"):
+        app.add_middleware(RequestTimingASGI)
+    # 最后添加 = 最外层：健康检查在所有中间件之前就返回
+    app.add_middleware(HealthASGI)
 
     # 3) 统一初始化 fastapi-cache2 和 MongoDB（总入口负责）
     @app.on_event("startup")
     async def _init_services():
         # 初始化 Redis 缓存
         try:
-            r = aioredis.from_url(REDIS_URL, encoding="utf8", decode_responses=True)
-            FastAPICache.init(RedisBackend(r), prefix="fastapi-cache")
+            # 共享连接池放在 app.state 上，缓存和其它需要 Redis 的地方复用同一批连接；
+            # from_url 是惰性的，先 ping 一次，连不上时才能真正回退到内存缓存
+            pool = aioredis.ConnectionPool.from_url(
+                REDIS_URL,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                encoding="utf8",
+                decode_responses=True,
+            )
+            app.state.redis_pool = pool
+            r = aioredis.Redis(connection_pool=pool)
+            await r.ping()
+            FastAPICache.init(RedisBackend(r), prefix="lapi")
             print(f"[run_main] ✅ fastapi-cache initialized with Redis: {REDIS_URL}")
         except Exception as e:
-            FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
+            FastAPICache.init(InMemoryBackend(), prefix="lapi")
             print(f"[run_main] ⚠️  Redis init failed ({e}), fallback to InMemory cache.")
         
         # 初始化 MongoDB
+        if not ENABLE_MONGO:
+            print("[run_main] MongoDB disabled (ENABLE_MONGO=0)")
+            return
         try:
             init_mongodb(MONGODB_URL, MONGODB_DB_NAME)
             print(f"[run_main] ✅ MongoDB initialized: {MONGODB_DB_NAME}")
@@ -84,23 +164,27 @@ def create_unified_app() -> FastAPI:
     # 4) 关闭连接
     @app.on_event("shutdown")
     async def _close_services():
-        try:
-            close_mongodb()
-            print("[run_main] MongoDB connection closed")
-        except Exception as e:
-            print(f"[run_main] Error closing MongoDB: {e}")
+        if ENABLE_MONGO:
+            try:
+                close_mongodb()
+                print("[run_main] MongoDB connection closed")
+            except Exception as e:
+                print(f"[run_main] Error closing MongoDB: {e}")
+        pool = getattr(app.state, "redis_pool", None)
+        if pool is not None:
+            await pool.disconnect()
+        shutdown_parse_pool()
+        shutdown_embed_executor()
+        await close_embed_redis()
 
     # 5) 合并路由（把两个子 app 的 routes 挂到总 app 上）
-    for route in audio_app.router.routes:
-        app.router.routes.append(route)
-    for route in user_app.router.routes:
-        app.router.routes.append(route)
+    app.router.routes.extend(audio_app.router.routes)
+    app.router.routes.extend(user_app.router.routes)
 
-    # 6) 合并异常处理器（顺序：先 audio，再 user；可按需要调整）
-    for key, handler in audio_app.exception_handlers.items():
-        app.add_exception_handler(key, handler)
-    for key, handler in user_app.exception_handlers.items():
-        app.add_exception_handler(key, handler)
+    # 6) 合并异常处理器（顺序：先 audio，再 user；同一个 key 后者覆盖前者）
+    #    中间件栈在第一次请求时才构建，直接更新字典与 add_exception_handler 等价
+    app.exception_handlers.update(audio_app.exception_handlers)
+    app.exception_handlers.update(user_app.exception_handlers)
 
     # 7) 静态文件（子 app 的 app.mount 不会自动带过来，所以在总 app 再挂一次）
     #    对齐 fastapi_backend/main.py 的 /files 逻辑
@@ -111,18 +195,24 @@ def create_unified_app() -> FastAPI:
     else:
         uploads_dir = (BASE_DIR / "fastapi_backend" / "uploads").resolve()
     uploads_dir.mkdir(parents=True, exist_ok=True)
-    print("[run_main] STATIC /files =>", uploads_dir)
-    app.mount("/files", StaticFiles(directory=str(uploads_dir)), name="uploaded_files")
+    #    生产环境由 Nginx 直接用 sendfile 发 /files（零拷贝，不占事件循环），设 SERVE_FILES=0 关掉这里的挂载：
+    #      location /files/ { alias <uploads_dir>/; sendfile on; tcp_nopush on; aio threads; }
+    #    本地开发默认仍由 StaticFiles 提供
+    if os.getenv("SERVE_FILES", "1").lower() in ("1", "true", "yes"):
+        print("[run_main] STATIC /files =>", uploads_dir)
+        app.mount("/files", StaticFiles(directory=str(uploads_dir)), name="uploaded_files")
+    else:
+        print("[run_main] /files served externally, uploads dir =>", uploads_dir)
 
     # 8) 统一的请求体验证错误处理（可选）
     @app.exception_handler(RequestValidationError)
     async def validation_exception_handler(request, exc):
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=422,
             content={"detail": exc.errors(), "body": exc.body},
         )
 
-    # 9) 健康检查
+    # 9) 健康检查（实际由 HealthASGI 短路返回；路由保留给 OpenAPI 文档）
     @app.get("/")
     def health_check():
         return {"status": "Unified backend running!"}
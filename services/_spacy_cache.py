@@ -0,0 +1,33 @@
+# services/_spacy_cache.py
+"""
+进程内共享的西班牙语 spaCy 管线
+SieleMarkupParser 和 NLPService 都从这里拿同一个 Language 对象，模型只加载一次
+
+约定：拿到的管线不要在运行时改动（enable_pipe / add_pipe / select_pipes 等），
+否则会影响所有使用者；__call__ / pipe 在组件不被修改时可以多线程共用
+"""
+from functools import lru_cache
+from typing import Tuple
+
+ES_MODEL = "es_core_news_sm"
+
+# 只用到词形、词元、词性和 is_stop/is_punct/is_space：依存分析和命名实体识别纯属浪费。
+# attribute_ruler 保留——它会修正词性，而规则词元化依赖词性。
+DEFAULT_DISABLED: Tuple[str, ...] = ("parser", "ner")
+
+
+@lru_cache(maxsize=4)
+def get_es_nlp(disable: Tuple[str, ...] = DEFAULT_DISABLED):
+    """按禁用组件组合缓存管线（参数必须是 tuple 才能作缓存键）"""
+    # 延迟导入：spaCy 连带 thinc 等导入要一秒多，只导入服务模块（不解析）的进程不必付这个代价
+    import spacy
+    try:
+        nlp = spacy.load(ES_MODEL, disable=list(disable))
+    except OSError as e:
+        # 模型随 requirements.txt 在构建时安装；运行时不再临时下载（会卡住首个请求，多 worker 还会互相抢）
+        raise RuntimeError(
+            f"spaCy 模型 {ES_MODEL} 未安装，请先执行 pip install -r requirements.txt"
+            f"（或 python -m spacy download {ES_MODEL}）"
+        ) from e
+    print(f"[spaCy] {ES_MODEL} pipes: {nlp.pipe_names}")
+    return nlp
@@ -1,59 +1,334 @@
-# services/markup_parser_enhanced.py
+# services/markup_parser.py
+import html
+import io
+import os
 import re
-from typing import List, Dict, Any, Tuple
-import spacy
+import sys
+import threading
+import numpy as np
+from dataclasses import dataclass
 from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 
+from services._spacy_cache import get_es_nlp
 
-class SieleMarkupParser:
+
+# 预编译的正则（解析每篇材料都会用到，避免每次调用都查 re 的模块缓存）
+# 元数据标记合成一个交替式：提取（按组名分派）和移除都只扫一遍。
+# 结尾的 :: 若紧接着就是下一个标记（::title:Foo::tarea:3::），只前瞻、不吞掉，留给下一个标记当开头
+_META_RE = re.compile(
+    r'::(?:tarea:(?P<tarea>\d+)|title:(?P<title>.+?))'
+    r'(?:::(?!tarea:|title:)|(?=::))'
+)
+# 选项/答案限定在单行且有长度上限：畸形输入（缺 ]] 或 [[/gap]]）时不会一路回溯到文末
+_CLOZE_RE = re.compile(r'\[\[gap(\d+)\|([^\]\n]{1,500})\]\]answer:([^\[\n]{1,100})\[\[/gap\]\]')
+_PIPE_SPLIT_RE = re.compile(r'\s*\|\s*')
+_QUESTION_RE = re.compile(r'::question::(.*?)::question::', re.DOTALL)
+# 题号只认行首的 “N. ”，题干/选项里出现的 “1990. ” 之类不会被当成下一题
+_QUESTION_SPLIT_RE = re.compile(r'(\d+)\.\s+(.+?)(?=\n\d+\.\s+|\Z)', re.DOTALL)
+_ANSWER_RE = re.compile(r'::answer:([A-Z])::')
+# 选项行（行首 [A] 内容）或答案标记，一次 finditer 扫完整道题；
+# 答案分支吞掉该行余下内容，保证同一行多个答案时取第一个（与逐行 search 一致）
+_OPTION_OR_ANSWER_RE = re.compile(
+    r'^[^\S\n]*\[(?P<opt>[A-Z])\][^\S\n]+(?P<content>\S[^\n]*)'
+    r'|::answer:(?P<ans>[A-Z])::[^\n]*',
+    re.MULTILINE
+)
+_PARA_SPLIT_RE = re.compile(r'\n---+\n')
+_GAP_PLACEHOLDER_RE = re.compile(r'___GAP\d+___')
+_GRAMMAR_LINE_RE = re.compile(r'(.+?)\s*\[(.+?)\]\s*(.+)')
+
+
+# nlp.pipe 每批送入的文档数
+SPACY_BATCH_SIZE = int(os.getenv("SIELE_SPACY_BATCH_SIZE", "64"))
+# 进程级缓存的 (原词, lemma, pos) -> word_id 条目数（高频虚词在一批材料里反复出现）
+WORD_ID_CACHE_SIZE = 8192
+
+
+# 词性符号 id -> (原名, 小写名)：词性只有十几种，全部复用同一对驻留字符串，
+# 不必每个 token 都从 StringStore 解码一次再 lower()
+_POS_NAMES: Dict[int, Tuple[str, str]] = {}
+
+
+def _pos_names(pos_id: int, strings) -> Tuple[str, str]:
+    names = _POS_NAMES.get(pos_id)
+    if names is None:
+        pos = sys.intern(strings[pos_id])
+        names = _POS_NAMES[pos_id] = (pos, sys.intern(pos.lower()))
+    return names
+
+
+# 段落内块标记（::zh:: / ::grammar::）单遍扫描的状态
+_STATE_TEXT = 0
+_STATE_BLOCK = 1
+_BLOCK_TAGS = ("zh", "grammar")
+
+
+def _scan_paragraph_blocks(raw_para: str) -> Tuple[str, Dict[str, str]]:
     """
-    SIELE 阅读材料标记解析器 + 词汇标注
+    单遍状态机扫描段落，不用正则回溯
+
+    Returns:
+        (西语正文, {"zh": "...", "grammar": "..."})
+        正文 = 第一个 ::zh:: / ::grammar:: 之前的内容；每种块只取第一个闭合的
     """
+    blocks: Dict[str, str] = {}
+    text_end = None
+    state = _STATE_TEXT
+    tag = None
+    content_start = 0
+    i = 0
+    n = len(raw_para)
+
+    while i < n:
+        if state == _STATE_TEXT:
+            pos = raw_para.find("::", i)
+            if pos < 0:
+                break
+            for candidate in _BLOCK_TAGS:
+                marker = "::" + candidate + "::"
+                if raw_para.startswith(marker, pos):
+                    if text_end is None:
+                        text_end = pos
+                    tag = candidate
+                    content_start = pos + len(marker)
+                    state = _STATE_BLOCK
+                    i = content_start
+                    break
+            else:
+                i = pos + 1
+        else:
+            marker = "::" + tag + "::"
+            close = raw_para.find(marker, content_start)
+            if close < 0:
+                # 未闭合的块：当作普通文本，继续向后扫描
+                state = _STATE_TEXT
+                i = content_start
+                continue
+            blocks.setdefault(tag, raw_para[content_start:close])
+            state = _STATE_TEXT
+            i = close + len(marker)
+
+    text_es = raw_para if text_end is None else raw_para[:text_end]
+    return text_es, blocks
+
+
+@dataclass
+class Annotations:
+    """
+    词汇标注（列式）：各字段下标对齐，按 start_char 升序
+    只在落库 / 返回 JSON 时才用 to_dicts() 展开成逐词字典
+    """
+    index: np.ndarray       # int32，token 在 doc 中的下标
+    start_char: np.ndarray  # int32
+    end_char: np.ndarray    # int32
+    word_id: np.ndarray     # int64，关联 words 表；-1 表示未匹配
+    word: List[str]
+    lemma: List[str]
+    pos: List[str]
     
-    def __init__(self, db_session=None):
-        self.nlp = spacy.load("es_core_news_sm")
-        self.db_session = db_session
-        self._word_mapping = None
-        self._word_fallback = None
+    def __len__(self) -> int:
+        return len(self.word)
     
-    def _init_word_mapping(self):
-        """初始化单词映射表"""
-        if self._word_mapping is not None:
-            return
-        
-        if self.db_session is None:
-            # 如果没有数据库连接，跳过词汇标注
-            self._word_mapping = {}
-            self._word_fallback = {}
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "index": i,
+                "word": w,
+                "lemma": l,
+                "pos": p,
+                "start_char": s,
+                "end_char": e,
+                "word_id": wid if wid >= 0 else None
+            }
+            for i, w, l, p, s, e, wid in zip(
+                self.index.tolist(), self.word, self.lemma, self.pos,
+                self.start_char.tolist(), self.end_char.tolist(), self.word_id.tolist()
+            )
+        ]
+    
+    @classmethod
+    def from_dicts(cls, annotations: List[Dict[str, Any]]) -> "Annotations":
+        anns = sorted(annotations, key=lambda x: x["start_char"])
+        return cls(
+            index=np.array([a.get("index", -1) for a in anns], dtype=np.int32),
+            start_char=np.array([a["start_char"] for a in anns], dtype=np.int32),
+            end_char=np.array([a["end_char"] for a in anns], dtype=np.int32),
+            word_id=np.array([a.get("word_id") or -1 for a in anns], dtype=np.int64),
+            word=[a["word"] for a in anns],
+            lemma=[a["lemma"] for a in anns],
+            pos=[a["pos"] for a in anns],
+        )
+
+
+# 逐词 lemma 对象的键（API 响应和 lemmas 列里的格式）
+_LEMMA_KEYS = ("index", "word", "lemma", "pos", "is_stop", "start_char", "end_char")
+
+
+def lemmas_to_dicts(lemmas: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """
+    把解析器内部的列式 lemmas 展开成逐词对象列表
+    （与 Annotations.to_dicts() 一样，只在返回 API / 落库前调用）
+    """
+    if not lemmas:
+        return []
+    return [
+        dict(zip(_LEMMA_KEYS, row))
+        for row in zip(*(lemmas[k] for k in _LEMMA_KEYS))
+    ]
+
+
+def _escape(value: str) -> str:
+    """只有真的含 HTML 特殊字符时才转义（绝大多数词不含，直接原样返回）"""
+    if '&' in value or '<' in value or '>' in value or '"' in value:
+        return html.escape(value, quote=True)
+    return value
+
+
+def _render_annotated_html(text: str, ann: Annotations, lo: int, hi: int, offset: int) -> str:
+    """把 ann[lo:hi] 渲染进 text；offset 为 text 在全文中的起始位置"""
+    starts = ann.start_char[lo:hi].tolist()
+    ends = ann.end_char[lo:hi].tolist()
+    word_ids = ann.word_id[lo:hi].tolist()
+    
+    lemmas = ann.lemma
+    poses = ann.pos
+    words = ann.word
+    
+    html_parts = []
+    append = html_parts.append
+    last_pos = 0
+    
+    for k, start, end, wid in zip(range(lo, hi), starts, ends, word_ids):
+        start -= offset
+        
+        # 添加单词之前的文本
+        if start > last_pos:
+            append(text[last_pos:start])
+        
+        # 添加标注的单词（3.11 上实测 f-string 约为 % 的一半、str.format 的三分之一耗时）
+        word_id = wid if wid > 0 else ""
+        append(
+            f'<span data-word-id="{word_id}" '
+            f'data-lemma="{_escape(lemmas[k])}" '
+            f'data-pos="{_escape(poses[k])}" '
+            f'class="word-link">'
+            f'{_escape(words[k])}</span>'
+        )
+        
+        last_pos = end - offset
+    
+    # 添加剩余文本
+    if last_pos < len(text):
+        append(text[last_pos:])
+    
+    return ''.join(html_parts)
+
+
+# 进程级词表映射："lemma\x00pos" -> word_id 和 lemma -> 第一个 word_id。
+# 同一进程里的解析器共用一份，只扫一次 words 表；words 表变更后调用 invalidate_word_mapping()
+_WORD_MAPPING: Optional[Dict[str, int]] = None
+_WORD_FALLBACK: Optional[Dict[str, int]] = None
+_WORD_MAPPING_LOCK = threading.Lock()
+
+
+def load_word_mapping(db_session) -> None:
+    """从 words 表建本进程的映射（已建好则直接返回）"""
+    global _WORD_MAPPING, _WORD_FALLBACK
+    if _WORD_MAPPING is not None:
+        return
+    
+    with _WORD_MAPPING_LOCK:
+        if _WORD_MAPPING is not None:
             return
-        
         try:
             from audio_backend.app.models.word import Word
             
-            words = self.db_session.query(Word).filter(
-                Word.lang_code == "es"
-            ).all()
+            # 只取三列（不经 ORM 实例化和 identity map），服务端游标分批流式读取：
+            # 词表很大时峰值内存只有一批行，边读边建映射
+            rows = (
+                db_session.query(Word.id, Word.lemma, Word.pos)
+                .filter(Word.lang_code == "es")
+                .execution_options(stream_results=True)
+                .yield_per(5000)
+            )
             
-            self._word_mapping = {}
-            self._word_fallback = {}
+            mapping = {}
+            fallback = {}
             
-            for w in words:
-                # 精确匹配: (lemma, pos) -> word_id
-                key = (w.lemma.lower(), w.pos.lower())
-                self._word_mapping[key] = w.id
+            for word_id, lemma, pos in rows:
+                lemma = lemma.lower()
+                # 精确匹配: "lemma\x00pos" -> word_id（字符串键比元组键哈希快、占用小）
+                mapping[f"{lemma}\x00{pos.lower()}"] = word_id
                 
-                # 回退匹配: lemma -> [word_ids]
-                self._word_fallback.setdefault(w.lemma.lower(), []).append(w.id)
+                # 回退匹配: lemma -> 第一个 word_id（查询时只会用第一个）
+                fallback.setdefault(lemma, word_id)
         
         except Exception as e:
+            # 不落缓存，下次解析再重试
             print(f"⚠️  词汇映射初始化失败: {e}")
-            self._word_mapping = {}
-            self._word_fallback = {}
+            return
+        
+        _WORD_FALLBACK = fallback
+        _WORD_MAPPING = mapping
+        # 建表前查过的词都缓存成了 -1
+        _lookup_word_id.cache_clear()
+
+
+def invalidate_word_mapping() -> None:
+    """丢弃本进程的词表映射和查询缓存，下次解析时重新从 words 表加载"""
+    global _WORD_MAPPING, _WORD_FALLBACK
+    with _WORD_MAPPING_LOCK:
+        _WORD_MAPPING = None
+        _WORD_FALLBACK = None
+        _lookup_word_id.cache_clear()
+
+
+@lru_cache(maxsize=WORD_ID_CACHE_SIZE)
+def _lookup_word_id(word_text: str, lemma: str, pos: str) -> int:
+    """
+    查 words 表 id（参数均已小写），-1 表示未匹配或映射未加载
+    """
+    mapping, fallback = _WORD_MAPPING, _WORD_FALLBACK
+    if mapping is None or fallback is None:
+        return -1
+    
+    # 策略1: 精确匹配 (lemma, pos)
+    word_id = mapping.get(f"{lemma}\x00{pos}")
+    if word_id is not None:
+        return word_id
     
-    def parse(self, raw_markup_text: str) -> Dict[str, Any]:
+    # 策略2: 回退到 lemma
+    word_id = fallback.get(lemma)
+    if word_id is not None:
+        return word_id
+    
+    # 策略3: 回退到原词
+    return fallback.get(word_text, -1)
+
+
+class SieleMarkupParser:
+    """
+    SIELE 阅读材料标记解析器 + 词汇标注
+    """
+    
+    def __init__(self, db_session=None):
+        self.nlp = get_es_nlp()
+        self.db_session = db_session
+    
+    def _init_word_mapping(self):
+        """确保本进程的词表映射已建好（没有数据库连接时跳过，未匹配的词 id 为 -1）"""
+        if self.db_session is not None:
+            load_word_mapping(self.db_session)
+    
+    def parse(self, raw_markup_text: str, *, with_nlp: bool = True) -> Dict[str, Any]:
         """
         解析标记文本 + 生成词汇标注
         
+        Args:
+            with_nlp: False 时只做结构解析（段落/题目），跳过 spaCy：
+                      lemmas / pos_distribution 为空，annotations 为空的 Annotations
+        
         Returns:
             {
                 "tarea_number": 1,
@@ -63,11 +338,50 @@ class SieleMarkupParser:
                 "paragraphs": [...],
                 "questions": [...],
                 "question_type": "single_choice" | "cloze_fragments" | "cloze_mc",
-                "lemmas": [...],
+                "lemmas": {"index": [...], "word": [...], ...},  # 列式，落库/返回前 lemmas_to_dicts()
                 "pos_distribution": {...},
-                "annotations": [...]  # ⭐ 词汇标注
+                "annotations": Annotations  # ⭐ 词汇标注（列式，落库/返回前 .to_dicts()）
             }
         """
+        return self.parse_many([raw_markup_text], with_nlp=with_nlp)[0]
+    
+    def parse_many(
+        self,
+        raw_texts: List[str],
+        batch_size: Optional[int] = None,
+        *,
+        with_nlp: bool = True,
+        n_process: int = 1
+    ) -> List[Dict[str, Any]]:
+        """
+        批量解析（批量导入用）：结构提取逐篇做，spaCy 分析一次 nlp.pipe 批量跑
+
+        Args:
+            batch_size: nlp.pipe 的批大小，默认取 SIELE_SPACY_BATCH_SIZE（64）
+            with_nlp: 同 parse()
+            n_process: nlp.pipe 的进程数（-1 = 全部 CPU）。只适合离线一次导入上百篇的脚本：
+                       每个子进程都要重新加载模型，篇数少时反而更慢；
+                       在 uvicorn worker / 请求处理里必须保持 1，不要在 Web 进程里派生子进程
+
+        Returns:
+            与 parse() 相同结构的结果列表，顺序与输入一致
+        """
+        results = [self._parse_structure(t) for t in raw_texts]
+        if not with_nlp:
+            for result in results:
+                result["annotations"] = Annotations.from_dicts([])
+            return results
+        docs = self.nlp.pipe(
+            (r["plain_text_es"] for r in results),
+            batch_size=batch_size or SPACY_BATCH_SIZE,
+            n_process=n_process
+        )
+        for result, doc in zip(results, docs):
+            self._fill_nlp(result, doc)
+        return results
+    
+    def _parse_structure(self, raw_markup_text: str) -> Dict[str, Any]:
+        """正则/扫描部分：元数据、题目、段落和纯西语文本（不涉及 spaCy）"""
         result = {
             "tarea_number": None,
             "title": None,
@@ -76,14 +390,13 @@ class SieleMarkupParser:
             "paragraphs": [],
             "questions": [],
             "question_type": "single_choice",
-            "lemmas": [],
+            "lemmas": {},
             "pos_distribution": {},
             "annotations": []  # ⭐ 词汇标注
         }
         
         # 1. 提取元数据
-        result["tarea_number"] = self._extract_tarea_number(raw_markup_text)
-        result["title"] = self._extract_title(raw_markup_text)
+        result["tarea_number"], result["title"] = self._extract_metadata(raw_markup_text)
         
         # 2. 判断题型并提取题目
         if result["tarea_number"] in [4, 5]:
@@ -102,217 +415,163 @@ class SieleMarkupParser:
         content_text = self._remove_metadata_tags(raw_markup_text)
         
         # 4. 按 --- 分段
-        raw_paragraphs = re.split(r'\n---+\n', content_text)
+        raw_paragraphs = _PARA_SPLIT_RE.split(content_text)
         
         # 5. 解析每个段落
-        current_char_pos = 0
-        spanish_text_parts = []
+        # 段落之间用空行分隔；start_char 直接取缓冲区当前偏移，
+        # 保证与最终 plain_text_es 中的位置一致（之前按 +1 累加，分隔符其实是两个字符）
+        buf = io.StringIO()
         
         for idx, raw_para in enumerate(raw_paragraphs):
             raw_para = raw_para.strip()
             if not raw_para:
                 continue
             
-            para_data = self._parse_paragraph(raw_para, idx + 1, current_char_pos)
-            
-            if para_data:
-                result["paragraphs"].append(para_data)
-                spanish_text_parts.append(para_data["text_es"])
-                current_char_pos += len(para_data["text_es"]) + 1
+            if result["paragraphs"]:
+                buf.write("\n\n")
+            para_data = self._parse_paragraph(raw_para, idx + 1, buf.tell())
+            buf.write(para_data["text_es"])
+            result["paragraphs"].append(para_data)
         
         # 6. 生成纯西班牙语文本
-        result["plain_text_es"] = "\n\n".join(spanish_text_parts)
-        
-        # 7. spaCy 分析
-        doc = self.nlp(result["plain_text_es"])
-        
-        # 生成 lemmas
-        result["lemmas"] = []
-        for i, token in enumerate(doc):
-            if not token.is_punct and not token.is_space:
-                result["lemmas"].append({
-                    "index": i,
-                    "word": token.text,
-                    "lemma": token.lemma_,
-                    "pos": token.pos_,
-                    "is_stop": token.is_stop,
-                    "start_char": token.idx,
-                    "end_char": token.idx + len(token.text)
-                })
-        
-        # 统计词性分布
-        result["pos_distribution"] = {}
-        for token in doc:
-            if not token.is_punct and not token.is_space:
-                result["pos_distribution"][token.pos_] = \
-                    result["pos_distribution"].get(token.pos_, 0) + 1
-        
-        # 8. ⭐ 生成词汇标注
-        result["annotations"] = self._generate_annotations(doc)
+        result["plain_text_es"] = buf.getvalue()
         
         return result
     
-    def _generate_annotations(self, doc) -> List[Dict[str, Any]]:
-        """
-        生成词汇标注（映射到 words 表）
+    def _fill_nlp(self, result: Dict[str, Any], doc) -> None:
+        """用 spaCy doc 填充 lemmas / pos_distribution / annotations"""
+        from spacy.attrs import ORTH, LEMMA, POS, IDX, IS_PUNCT, IS_SPACE, IS_STOP
         
-        Returns:
-            [
-                {
-                    "index": 0,
-                    "word": "Hola",
-                    "lemma": "hola",
-                    "pos": "intj",
-                    "start_char": 0,
-                    "end_char": 4,
-                    "word_id": 12345  # 关联到 words 表
-                },
-                ...
-            ]
-        """
         # 初始化词汇映射
         self._init_word_mapping()
         
-        annotations = []
+        # 一次 to_array 在 Cython 里取出全部 token 的属性（字符串是哈希 id），
+        # 标点/空白用 numpy 掩码过滤掉，Python 循环只处理保留下来的行、也不再逐个构造 Token
+        arr = doc.to_array([ORTH, LEMMA, POS, IDX, IS_PUNCT, IS_SPACE, IS_STOP])
+        kept = np.flatnonzero((arr[:, 4] == 0) & (arr[:, 5] == 0))
+        rows = arr[kept]
+        strings = doc.vocab.strings
+        
+        # 词性分布：直接对保留行的 POS 列计数
+        pos_ids, pos_counts = np.unique(rows[:, 2], return_counts=True)
+        result["pos_distribution"] = {
+            strings[p]: c for p, c in zip(pos_ids.tolist(), pos_counts.tolist())
+        }
         
-        for i, token in enumerate(doc):
-            # 跳过标点和空格
-            if token.is_punct or token.is_space:
-                continue
-            
-            word_text = token.text.lower()
-            lemma = token.lemma_.lower()
-            pos = token.pos_.lower()
-            
-            # 查找 word_id
-            word_id = None
+        # 7. lemmas（列式：每个字段一个列表，下标对齐）；8. ⭐ 词汇标注，同一遍生成
+        index = kept.tolist()
+        start_col = rows[:, 3].tolist()
+        is_stop = rows[:, 6].astype(bool).tolist()
+        words, lemma_col, pos_col, end_col = [], [], [], []
+        ann_lemmas, ann_poses, word_ids = [], [], []
+        lookup = _lookup_word_id
+        intern = sys.intern
+        for orth, lemma_id, pos_id, idx in zip(
+            rows[:, 0].tolist(), rows[:, 1].tolist(), rows[:, 2].tolist(), start_col
+        ):
+            text = strings[orth]
+            # 词元同样驻留：一批材料里同一个词元的所有出现共用一个字符串对象
+            lemma = intern(strings[lemma_id])
+            pos, pos_lower = _pos_names(pos_id, strings)
+            words.append(text)
+            lemma_col.append(lemma)
+            pos_col.append(pos)
+            end_col.append(idx + len(text))
             
-            # 策略1: 精确匹配 (lemma, pos)
-            if (lemma, pos) in self._word_mapping:
-                word_id = self._word_mapping[(lemma, pos)]
-            
-            # 策略2: 回退到 lemma
-            elif lemma in self._word_fallback:
-                word_id = self._word_fallback[lemma][0]  # 取第一个
-            
-            # 策略3: 回退到原词
-            elif word_text in self._word_fallback:
-                word_id = self._word_fallback[word_text][0]
-            
-            annotations.append({
-                "index": i,
-                "word": token.text,
-                "lemma": lemma,
-                "pos": pos,
-                "start_char": token.idx,
-                "end_char": token.idx + len(token.text),
-                "word_id": word_id  # 可能为 None
-            })
-        
-        return annotations
+            lemma = intern(lemma.lower())
+            ann_lemmas.append(lemma)
+            ann_poses.append(pos_lower)
+            word_ids.append(lookup(text.lower(), lemma, pos_lower))
+        
+        result["lemmas"] = {
+            "index": index,
+            "word": words,
+            "lemma": lemma_col,
+            "pos": pos_col,
+            "is_stop": is_stop,
+            "start_char": start_col,
+            "end_char": end_col
+        }
+        result["annotations"] = Annotations(
+            index=np.array(index, dtype=np.int32),
+            start_char=np.array(start_col, dtype=np.int32),
+            end_char=np.array(end_col, dtype=np.int32),
+            word_id=np.array(word_ids, dtype=np.int64),
+            word=words,
+            lemma=ann_lemmas,
+            pos=ann_poses,
+        )
     
-    def generate_annotated_html(self, plain_text_es: str, annotations: List[Dict]) -> str:
+    def generate_annotated_html(
+        self,
+        plain_text_es: str,
+        annotations,
+        char_offset: int = 0
+    ) -> str:
         """
         生成带词汇标注的 HTML
         
         Args:
             plain_text_es: 纯西班牙语文本
-            annotations: 词汇标注列表
+            annotations: Annotations，或旧格式的标注字典列表
+            char_offset: plain_text_es 在全文中的起始位置（标注位置是全文坐标时传入，
+                         渲染时就地减去，不必先复制标注再改位置）
         
         Returns:
             HTML 字符串，每个单词都有 data-word-id 属性
         """
-        if not annotations:
+        if not len(annotations):
             return plain_text_es
-        
-        # 按字符位置排序
-        annotations = sorted(annotations, key=lambda x: x["start_char"])
-        
-        html_parts = []
-        last_pos = 0
-        
-        for ann in annotations:
-            start = ann["start_char"]
-            end = ann["end_char"]
-            word = ann["word"]
-            word_id = ann.get("word_id") or ""
-            lemma = ann["lemma"]
-            pos = ann["pos"]
-            
-            # 添加单词之前的文本
-            if start > last_pos:
-                html_parts.append(plain_text_es[last_pos:start])
-            
-            # 添加标注的单词
-            html_parts.append(
-                f'<span data-word-id="{word_id}" '
-                f'data-lemma="{lemma}" '
-                f'data-pos="{pos}" '
-                f'class="word-link">'
-                f'{word}</span>'
-            )
-            
-            last_pos = end
-        
-        # 添加剩余文本
-        if last_pos < len(plain_text_es):
-            html_parts.append(plain_text_es[last_pos:])
-        
-        return ''.join(html_parts)
+        if not isinstance(annotations, Annotations):
+            annotations = Annotations.from_dicts(annotations)
+        return _render_annotated_html(
+            plain_text_es, annotations, 0, len(annotations), char_offset
+        )
     
-    def generate_paragraph_html(self, paragraphs: List[Dict], annotations: List[Dict]) -> List[Dict]:
+    def generate_paragraph_html(self, paragraphs: List[Dict], annotations) -> List[Dict]:
         """
         为每个段落生成带标注的 HTML
         
         Args:
             paragraphs: 段落列表
-            annotations: 词汇标注列表
+            annotations: Annotations，或旧格式的标注字典列表
         
         Returns:
-            更新后的段落列表（增加 html_es 字段）
+            同一个段落列表，每个段落字典就地加上 html_es 字段
         """
-        result = []
-        
-        for para in paragraphs:
-            start_char = para["start_char"]
-            end_char = para["end_char"]
-            
-            # 筛选这个段落的标注
-            para_annotations = [
-                ann for ann in annotations
-                if start_char <= ann["start_char"] < end_char
-            ]
-            
-            # 调整标注的字符位置（相对于段落开头）
-            adjusted_annotations = []
-            for ann in para_annotations:
-                adjusted = ann.copy()
-                adjusted["start_char"] -= start_char
-                adjusted["end_char"] -= start_char
-                adjusted_annotations.append(adjusted)
-            
-            # 生成 HTML
-            html_es = self.generate_annotated_html(
-                para["text_es"],
-                adjusted_annotations
+        if not isinstance(annotations, Annotations):
+            annotations = Annotations.from_dicts(annotations)
+        
+        # 标注按 start_char 升序：一次 searchsorted 批量求出每段 [start, end) 对应的标注区间
+        bounds = np.searchsorted(
+            annotations.start_char,
+            [(p["start_char"], p["end_char"]) for p in paragraphs],
+            side="left"
+        ).tolist()
+        
+        for para, (lo, hi) in zip(paragraphs, bounds):
+            # 生成 HTML（位置换算成相对段落开头）
+            para["html_es"] = _render_annotated_html(
+                para["text_es"], annotations, lo, hi, para["start_char"]
             )
-            
-            # 添加到结果
-            para_copy = para.copy()
-            para_copy["html_es"] = html_es
-            result.append(para_copy)
         
-        return result
+        return paragraphs
     
     # ========== 以下是原有的解析方法（不变） ==========
     
-    def _extract_tarea_number(self, text: str) -> int:
-        match = re.search(r'::tarea:(\d+)::', text)
-        return int(match.group(1)) if match else 1
-    
-    def _extract_title(self, text: str) -> str:
-        match = re.search(r'::title:(.+?)::', text)
-        return match.group(1).strip() if match else None
+    def _extract_metadata(self, text: str) -> Tuple[int, Optional[str]]:
+        """一次 finditer 同时取 tarea 编号和标题（各取第一个），两者都拿到就提前结束"""
+        tarea_number = None
+        title = None
+        for match in _META_RE.finditer(text):
+            if match.lastgroup == "tarea":
+                if tarea_number is None:
+                    tarea_number = int(match.group("tarea"))
+            elif title is None:
+                title = match.group("title").strip()
+            if tarea_number is not None and title is not None:
+                break
+        return (tarea_number if tarea_number is not None else 1), title
     
     def _extract_cloze_questions(
         self, 
@@ -322,15 +581,13 @@ class SieleMarkupParser:
         questions = []
         question_type = "cloze_fragments" if tarea_number == 4 else "cloze_mc"
         
-        pattern = r'\[\[gap(\d+)\|([^\]]+)\]\]answer:([^\[]+)\[\[/gap\]\]'
-        matches = re.finditer(pattern, text)
-        
-        for match in matches:
+        # 一次 sub 同时收集题目并替换成占位符：文本只扫一遍
+        def _collect(match: re.Match) -> str:
             gap_number = int(match.group(1))
             options_str = match.group(2)
             correct_answer = match.group(3).strip()
             
-            options_list = [opt.strip() for opt in options_str.split('|')]
+            options_list = _PIPE_SPLIT_RE.split(options_str.strip())
             
             options = []
             for i, option_content in enumerate(options_list):
@@ -356,61 +613,53 @@ class SieleMarkupParser:
                 "question_type": question_type,
                 "options": options
             })
+            return f"___GAP{match.group(1)}___"
         
-        cleaned_text = re.sub(pattern, r'___GAP\1___', text)
+        cleaned_text = _CLOZE_RE.sub(_collect, text)
         
         return cleaned_text, questions, question_type
     
     def _extract_questions(self, text: str) -> Tuple[str, List[Dict]]:
         questions = []
         
-        question_pattern = r'::question::(.*?)::question::'
-        matches = re.finditer(question_pattern, text, re.DOTALL)
-        
-        for match in matches:
+        # 同上：解析题块的同时把它从正文里删掉
+        def _collect(match: re.Match) -> str:
             question_block = match.group(1).strip()
-            parsed_questions = self._parse_question_block(question_block)
-            questions.extend(parsed_questions)
+            questions.extend(self._parse_question_block(question_block))
+            return ''
         
-        cleaned_text = re.sub(question_pattern, '', text, flags=re.DOTALL)
+        cleaned_text = _QUESTION_RE.sub(_collect, text)
         
         return cleaned_text, questions
     
     def _parse_question_block(self, block: str) -> List[Dict]:
         questions = []
         
-        pattern = r'(\d+)\.\s+(.+?)(?=\d+\.\s+|$)'
-        matches = re.finditer(pattern, block, re.DOTALL)
-        
-        for match in matches:
+        for match in _QUESTION_SPLIT_RE.finditer(block):
             question_num = int(match.group(1))
             question_content = match.group(2).strip()
             
-            lines = question_content.split('\n')
-            stem = lines[0].strip()
+            stem, _, rest = question_content.partition('\n')
+            stem = stem.strip()
             
             options = []
             correct_answer = None
             
-            for line in lines[1:]:
-                line = line.strip()
-                if not line:
+            for m in _OPTION_OR_ANSWER_RE.finditer(rest):
+                label = m.group("opt")
+                if label is None:
+                    correct_answer = m.group("ans")
                     continue
-                
-                option_match = re.match(r'\[([A-Z])\]\s+(.+)', line)
-                if option_match:
-                    label = option_match.group(1)
-                    content = option_match.group(2).strip()
-                    content = re.sub(r'::answer:[A-Z]::', '', content).strip()
-                    options.append({
-                        "label": label,
-                        "content": content,
-                        "is_correct": False
-                    })
-                
-                answer_match = re.search(r'::answer:([A-Z])::', line)
+                content = m.group("content")
+                answer_match = _ANSWER_RE.search(content)
                 if answer_match:
                     correct_answer = answer_match.group(1)
+                    content = _ANSWER_RE.sub('', content)
+                options.append({
+                    "label": label,
+                    "content": content.strip(),
+                    "is_correct": False
+                })
             
             if correct_answer:
                 for opt in options:
@@ -428,9 +677,7 @@ class SieleMarkupParser:
         return questions
     
     def _remove_metadata_tags(self, text: str) -> str:
-        text = re.sub(r'::tarea:\d+::', '', text)
-        text = re.sub(r'::title:.+?::', '', text)
-        return text.strip()
+        return _META_RE.sub('', text).strip()
     
     def _parse_paragraph(
         self, 
@@ -438,24 +685,22 @@ class SieleMarkupParser:
         paragraph_id: int,
         start_char: int
     ) -> Dict[str, Any]:
-        spanish_match = re.match(r'^(.*?)(?=::zh::|::grammar::|$)', raw_para, re.DOTALL)
-        text_es = spanish_match.group(1).strip() if spanish_match else raw_para.strip()
+        text_es, blocks = _scan_paragraph_blocks(raw_para)
+        text_es = text_es.strip()
         
-        text_es = re.sub(r'___GAP\d+___', '[___]', text_es)
+        text_es = _GAP_PLACEHOLDER_RE.sub('[___]', text_es)
         
-        zh_match = re.search(r'::zh::(.*?)::zh::', raw_para, re.DOTALL)
-        text_zh = zh_match.group(1).strip() if zh_match else ""
+        text_zh = blocks.get("zh", "").strip()
         
         grammar_notes = []
-        grammar_match = re.search(r'::grammar::(.*?)::grammar::', raw_para, re.DOTALL)
         
-        if grammar_match:
-            grammar_text = grammar_match.group(1).strip()
+        if "grammar" in blocks:
+            grammar_text = blocks["grammar"].strip()
             for line in grammar_text.split('\n'):
                 line = line.strip()
                 if line.startswith('-'):
                     line = line[1:].strip()
-                    note_match = re.match(r'(.+?)\s*\[(.+?)\]\s*(.+)', line)
+                    note_match = _GRAMMAR_LINE_RE.match(line)
                     if note_match:
                         grammar_notes.append({
                             "word": note_match.group(1).strip(),
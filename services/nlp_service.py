@@ -3,58 +3,160 @@
 NLP 分析服务
 提供西班牙语文本的词性分析和难度评估
 """
-import spacy
+import sys
 from functools import lru_cache
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+from services._spacy_cache import get_es_nlp
+
+
+# 复杂词性权重（固定顺序的元组，模块加载时建一次）
+_COMPLEX_POS_WEIGHTS = (
+    ("VERB", 0.3),
+    ("ADJ", 0.2),
+    ("ADV", 0.2),
+    ("NOUN", 0.1),
+)
+
+
+# analyze_summary 按文本缓存的条目数（只存标量，预览→创建同一篇时命中）
+SUMMARY_CACHE_SIZE = 128
 
 
 class NLPService:
     """NLP 分析服务"""
     
     def __init__(self):
-        try:
-            self.nlp = spacy.load("es_core_news_sm")
-        except OSError:
-            print("⚠️  spaCy 模型未安装，正在下载...")
-            import subprocess
-            subprocess.run(["python", "-m", "spacy", "download", "es_core_news_sm"])
-            self.nlp = spacy.load("es_core_news_sm")
+        # 模型缺失时 get_es_nlp 直接抛 RuntimeError，不在请求路径上临时下载
+        self.nlp = get_es_nlp()
+        # 共享管线里不带 parser，分句单独调用模型自带的 senter（默认禁用，但仍可直接拿来用），
+        # 不去 enable_pipe 改动其它使用者的管线
+        if "senter" in self.nlp.component_names:
+            self._senter = self.nlp.get_pipe("senter")
+        else:
+            from spacy.pipeline import Sentencizer
+            self._senter = Sentencizer()
     
     def analyze_text(self, text: str) -> Dict[str, Any]:
         """
-        分析西班牙语文本
+        分析西班牙语文本（不缓存：逐词 lemmas 很大，且每次都返回新的、调用方可随意修改的字典）
         
         Returns:
             {
                 "lemmas": [...],
                 "pos_distribution": {...},
                 "word_count": int,
-                "sentence_count": int
+                "sentence_count": int,
+                "difficulty_level": float
             }
         """
-        doc = self.nlp(text)
+        return self._analyze_doc(self._senter(self.nlp(text)))
+    
+    def analyze_summary(self, text: str) -> Dict[str, Any]:
+        """
+        只要统计值时用（不含 lemmas）：按文本缓存标量结果，每次返回新字典
+        
+        Returns:
+            {"pos_distribution": {...}, "word_count": int, "sentence_count": int, "difficulty_level": float}
+        """
+        pos_items, word_count, sentence_count, difficulty_level = _cached_summary(text)
+        return {
+            "pos_distribution": dict(pos_items),
+            "word_count": word_count,
+            "sentence_count": sentence_count,
+            "difficulty_level": difficulty_level
+        }
+    
+    def _summary(self, text: str) -> Tuple[Tuple[Tuple[str, int], ...], int, int, float]:
+        """统计值压成不可变元组，供 _cached_summary 缓存"""
+        result = self._analyze_doc(self._senter(self.nlp(text)), with_lemmas=False)
+        return (
+            tuple(result["pos_distribution"].items()),
+            result["word_count"],
+            result["sentence_count"],
+            result["difficulty_level"]
+        )
+    
+    def analyze_many(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        n_process: int = 1
+    ) -> List[Dict[str, Any]]:
+        """
+        批量分析：通过 nlp.pipe 按批送入 spaCy，摊薄逐篇调用的开销
         
-        # 生成 lemmas
+        n_process > 1（或 -1）只用于离线批量导入脚本，Web 进程里保持 1（同 SieleMarkupParser.parse_many）
+        
+        Returns:
+            与 texts 顺序一致的 analyze_text 结果列表
+        """
+        docs = self._senter.pipe(
+            self.nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+        )
+        return [self._analyze_doc(doc) for doc in docs]
+    
+    def analyze_summary_many(
+        self,
+        texts: List[str],
+        batch_size: int = 32,
+        n_process: int = 1
+    ) -> List[Dict[str, Any]]:
+        """
+        批量版 analyze_summary：同样走 nlp.pipe，但不构造逐词 lemmas（批量导入只落统计值）
+        
+        Returns:
+            与 texts 顺序一致的 analyze_summary 结果列表
+        """
+        docs = self._senter.pipe(
+            self.nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+        )
+        results = []
+        for doc in docs:
+            result = self._analyze_doc(doc, with_lemmas=False)
+            del result["lemmas"]
+            results.append(result)
+        return results
+    
+    def _analyze_doc(self, doc, with_lemmas: bool = True) -> Dict[str, Any]:
+        from spacy.attrs import ORTH, LEMMA, POS, IDX, IS_PUNCT, IS_SPACE, IS_STOP
+        
+        # 一次 to_array 取出全部 token 属性，标点/空白在 numpy 里过滤（同 SieleMarkupParser._fill_nlp）
+        arr = doc.to_array([ORTH, LEMMA, POS, IDX, IS_PUNCT, IS_SPACE, IS_STOP])
+        kept = np.flatnonzero((arr[:, 4] == 0) & (arr[:, 5] == 0))
+        rows = arr[kept]
+        strings = doc.vocab.strings
+        
+        # 词性分布
+        pos_ids, pos_counts = np.unique(rows[:, 2], return_counts=True)
+        pos_distribution = {
+            strings[p]: c for p, c in zip(pos_ids.tolist(), pos_counts.tolist())
+        }
+        
+        # 生成 lemmas（只要统计值时跳过）
         lemmas = []
-        for i, token in enumerate(doc):
-            if not token.is_punct and not token.is_space:
-                lemmas.append({
+        if with_lemmas:
+            append = lemmas.append
+            intern = sys.intern
+            for i, orth, lemma_id, pos_id, idx, is_stop in zip(
+                kept.tolist(), rows[:, 0].tolist(), rows[:, 1].tolist(),
+                rows[:, 2].tolist(), rows[:, 3].tolist(), rows[:, 6].tolist()
+            ):
+                text = strings[orth]
+                # 词元/词性驻留：重复的词元和词性只留一份字符串对象
+                append({
                     "index": i,
-                    "word": token.text,
-                    "lemma": token.lemma_,
-                    "pos": token.pos_,
-                    "is_stop": token.is_stop,
-                    "start_char": token.idx,
-                    "end_char": token.idx + len(token.text)
+                    "word": text,
+                    "lemma": intern(strings[lemma_id]),
+                    "pos": intern(strings[pos_id]),
+                    "is_stop": bool(is_stop),
+                    "start_char": idx,
+                    "end_char": idx + len(text)
                 })
         
-        # 统计词性分布
-        pos_distribution = {}
-        word_count = 0
-        for token in doc:
-            if not token.is_punct and not token.is_space:
-                pos_distribution[token.pos_] = pos_distribution.get(token.pos_, 0) + 1
-                word_count += 1
+        word_count = len(kept)
         
         # 统计句子数
         sentence_count = len(list(doc.sents))
@@ -63,7 +165,8 @@ class NLPService:
             "lemmas": lemmas,
             "pos_distribution": pos_distribution,
             "word_count": word_count,
-            "sentence_count": sentence_count
+            "sentence_count": sentence_count,
+            "difficulty_level": self.estimate_difficulty(pos_distribution, word_count)
         }
     
     def estimate_difficulty(self, pos_distribution: Dict[str, int], word_count: int) -> float:
@@ -80,19 +183,11 @@ class NLPService:
         # 基础难度 = 词汇量影响
         base_difficulty = min(word_count / 100.0, 5.0)  # 最多 5 分
         
-        # 复杂词性权重
-        complex_pos_weight = {
-            "VERB": 0.3,
-            "ADJ": 0.2,
-            "ADV": 0.2,
-            "NOUN": 0.1
-        }
-        
-        # 计算复杂度得分
-        complexity_score = 0.0
-        for pos, count in pos_distribution.items():
-            if pos in complex_pos_weight:
-                complexity_score += (count / word_count) * complex_pos_weight[pos] * 10
+        # 计算复杂度得分：只查四个复杂词性，不遍历整个分布
+        get = pos_distribution.get
+        complexity_score = sum(
+            get(pos, 0) * weight for pos, weight in _COMPLEX_POS_WEIGHTS
+        ) / word_count * 10
         
         # 总难度 = 基础难度 + 复杂度得分
         total_difficulty = base_difficulty + complexity_score
@@ -105,4 +200,12 @@ class NLPService:
 @lru_cache(maxsize=1)
 def get_nlp_service() -> NLPService:
     """获取 NLP 服务单例"""
-    return NLPService()
\ No newline at end of file
+    return NLPService()
+
+@lru_cache(maxsize=SUMMARY_CACHE_SIZE)
+def _cached_summary(text: str) -> Tuple[Tuple[Tuple[str, int], ...], int, int, float]:
+    """
+    analyze_summary 的进程级缓存：放在模块层、只以文本为键（不把 self 放进缓存键，实例不会被缓存拖住）；
+    缓存值只有不可变的标量/元组，进程池每个 worker 各一份也占不了多少内存
+    """
+    return get_nlp_service()._summary(text)
@@ -0,0 +1,124 @@
+# services/parse_worker.py
+"""
+标记解析 + NLP 分析的进程池
+SieleMarkupParser.parse 和 NLP 分析都是持有 GIL 的纯 CPU 计算，
+放到独立进程里并发的管理员导入才能真正用上多核
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+_PARSE_POOL: Optional[ProcessPoolExecutor] = None
+# 默认 worker 数：每个 worker 各持一份 spaCy 模型和词表映射，内存随进程数线性增长
+PARSE_WORKERS = int(os.getenv("SIELE_PARSE_WORKERS", "2"))
+
+# worker 进程内复用的解析器（_init_worker 中创建）
+_WORKER_PARSER = None
+
+
+def _init_worker() -> None:
+    """
+    每个 worker 进程启动时执行一次：加载 spaCy 模型、扫一遍 words 表建映射，
+    之后该进程处理的所有解析都复用，不再逐次开会话、建解析器、全表扫描
+    """
+    global _WORKER_PARSER
+    from audio_backend.app.core.database import SessionLocal
+    from services.markup_parser import SieleMarkupParser, load_word_mapping
+
+    db = SessionLocal()
+    try:
+        load_word_mapping(db)
+    finally:
+        db.close()
+    # 映射是进程级的，解析器本身不需要持有会话
+    _WORKER_PARSER = SieleMarkupParser()
+
+
+def _worker_parser():
+    """取 worker 进程的解析器（不经进程池直接调用时现场初始化）"""
+    if _WORKER_PARSER is None:
+        _init_worker()
+    return _WORKER_PARSER
+
+
+def _parse_and_analyze(
+    markup_text: str,
+    with_html: bool = False,
+    with_nlp: bool = True
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    在 worker 进程中执行：解析标记 + 词汇标注 + NLP 分析
+    一次返回 (parsed_data, nlp_result)，避免大字典来回 pickle 两次
+
+    with_nlp=False 时只做结构解析：不跑 spaCy，nlp_result 为 None
+    """
+    from services.markup_parser import lemmas_to_dicts
+
+    parser = _worker_parser()
+
+    if not with_nlp:
+        parsed_data = parser.parse(markup_text, with_nlp=False)
+        parsed_data["lemmas"] = []
+        parsed_data["annotations"] = []
+        return parsed_data, None
+
+    from services.nlp_service import get_nlp_service
+
+    parsed_data = parser.parse(markup_text)
+
+    # 只用到统计值（lemmas 由解析器产出），取不含逐词列表的缓存摘要
+    nlp_result = get_nlp_service().analyze_summary(parsed_data["plain_text_es"])
+
+    if with_html and len(parsed_data["annotations"]):
+        parsed_data["paragraphs"] = parser.generate_paragraph_html(
+            parsed_data["paragraphs"],
+            parsed_data["annotations"]
+        )
+    # 出进程池之前展开成可落库 / 可 JSON 序列化的字典列表
+    parsed_data["lemmas"] = lemmas_to_dicts(parsed_data["lemmas"])
+    parsed_data["annotations"] = parsed_data["annotations"].to_dicts()
+
+    return parsed_data, nlp_result
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """惰性创建进程池（spawn，避免 fork 带上事件循环/连接池的状态）"""
+    global _PARSE_POOL
+    if _PARSE_POOL is None:
+        _PARSE_POOL = ProcessPoolExecutor(
+            max_workers=PARSE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+    return _PARSE_POOL
+
+
+async def parse_and_analyze(markup_text: str, with_html: bool = False, with_nlp: bool = True):
+    """在进程池中解析并分析标记文本，返回 (parsed_data, nlp_result)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_parse_pool(), _parse_and_analyze, markup_text, with_html, with_nlp
+    )
+
+
+def shutdown_parse_pool() -> None:
+    global _PARSE_POOL
+    if _PARSE_POOL is not None:
+        _PARSE_POOL.shutdown(wait=False, cancel_futures=True)
+        _PARSE_POOL = None
+
+
+def invalidate_word_mapping() -> None:
+    """
+    words 表变更后调用：丢弃本进程的词表映射；worker 的映射是启动时建的，
+    直接换一批 worker（进行中的任务照常跑完），下次提交时重新加载
+    """
+    from services.markup_parser import invalidate_word_mapping as invalidate_local
+
+    global _PARSE_POOL
+    invalidate_local()
+    if _PARSE_POOL is not None:
+        _PARSE_POOL.shutdown(wait=False)
+        _PARSE_POOL = None
@@ -0,0 +1,38 @@
+# tests/test_markup_metadata.py
+"""SieleMarkupParser 元数据标记（::tarea:N:: / ::title:...::）的提取与移除"""
+import pytest
+
+from services.markup_parser import SieleMarkupParser
+
+
+@pytest.fixture
+def parser() -> SieleMarkupParser:
+    # 元数据处理不碰 spaCy，跳过 __init__ 里的模型加载
+    return SieleMarkupParser.__new__(SieleMarkupParser)
+
+
+@pytest.mark.parametrize("text", [
+    "::title:Foo::tarea:3::",
+    "::tarea:3::title:Foo::",
+    "::tarea:3::\n::title:Foo::",
+    "::title: Foo ::\ntexto ::tarea:3::",
+])
+def test_extract_both_tags(parser, text):
+    assert parser._extract_metadata(text) == (3, "Foo")
+
+
+def test_extract_defaults(parser):
+    assert parser._extract_metadata("texto sin etiquetas") == (1, None)
+
+
+def test_first_tag_wins(parser):
+    assert parser._extract_metadata("::tarea:2::title:A::tarea:4::title:B::") == (2, "A")
+
+
+@pytest.mark.parametrize("text", [
+    "::title:Foo::tarea:3::Hola",
+    "::tarea:3::title:Foo::Hola",
+    "::tarea:3::\n::title:Foo::\nHola",
+])
+def test_remove_both_tags(parser, text):
+    assert parser._remove_metadata_tags(text) == "Hola"
@@ -0,0 +1,111 @@
+# tests/test_story_stream_upload.py
+"""_stream_multipart：异常 / 截断的请求体不能在 uploads/ 里留下文件"""
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from fastapi_backend.routes import story_routes
+
+BOUNDARY = "testboundary"
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch) -> Path:
+    root = tmp_path.resolve()
+    monkeypatch.setattr(story_routes, "UPLOADS_DIR", root)
+    monkeypatch.setattr(story_routes, "_UPLOADS_STR", str(root))
+    return root
+
+
+@pytest.fixture
+def client(upload_dir) -> TestClient:
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        fields, files = await story_routes._stream_multipart(request)
+        return {"fields": fields, "files": files}
+
+    return TestClient(app)
+
+
+def _part(name: str, body: bytes, filename: str = None) -> bytes:
+    disposition = f'form-data; name="{name}"'
+    if filename is not None:
+        disposition += f'; filename="{filename}"'
+    return (
+        f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode()
+        + body
+        + b"\r\n"
+    )
+
+
+def _post(client: TestClient, body: bytes):
+    return client.post(
+        "/upload",
+        content=body,
+        headers={"content-type": f"multipart/form-data; boundary={BOUNDARY}"},
+    )
+
+
+def _stored_files(root: Path):
+    return [p for p in root.rglob("*") if p.is_file()]
+
+
+def test_complete_body_keeps_cover_image(client, upload_dir):
+    body = (
+        _part("title", "Hola".encode())
+        + _part("cover_image", b"\x89PNG" * 100, filename="c.png")
+        + f"--{BOUNDARY}--\r\n".encode()
+    )
+    resp = _post(client, body)
+    assert resp.status_code == 200
+    assert resp.json()["fields"] == {"title": "Hola"}
+    assert len(_stored_files(upload_dir)) == 1
+
+
+def test_body_truncated_inside_file_part_is_rejected_and_cleaned_up(client, upload_dir):
+    body = (
+        _part("title", "Hola".encode())
+        + f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="cover_image"; '
+          f'filename="c.png"\r\n\r\n'.encode()
+        + b"\x89PNG" * 100  # 没有结尾的 boundary
+    )
+    resp = _post(client, body)
+    assert resp.status_code == 400
+    assert _stored_files(upload_dir) == []
+
+
+def test_earlier_file_is_removed_when_later_part_is_truncated(client, upload_dir):
+    body = (
+        _part("cover_image", b"\x89PNG" * 100, filename="c.png")
+        + f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="summary"\r\n\r\n'.encode()
+        + b"cut off"
+    )
+    resp = _post(client, body)
+    assert resp.status_code == 400
+    assert _stored_files(upload_dir) == []
+
+
+def test_invalid_utf8_field_is_a_client_error(client, upload_dir):
+    body = (
+        _part("cover_image", b"\x89PNG", filename="c.png")
+        + _part("title", b"\xff\xfe")
+        + f"--{BOUNDARY}--\r\n".encode()
+    )
+    resp = _post(client, body)
+    assert resp.status_code == 400
+    assert _stored_files(upload_dir) == []
+
+
+def test_non_cover_file_parts_are_not_written(client, upload_dir):
+    body = (
+        _part("attachment", b"data", filename="a.bin")
+        + f"--{BOUNDARY}--\r\n".encode()
+    )
+    resp = _post(client, body)
+    assert resp.status_code == 200
+    assert resp.json()["files"] == {}
+    assert _stored_files(upload_dir) == []